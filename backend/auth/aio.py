@@ -0,0 +1,104 @@
+import json
+import hashlib
+import secrets
+from typing import Dict, Any
+from aiodb import get_pool, fetchrow, execute
+from sessions import SESSION_TTL_DAYS, hash_token, bearer_token, forget_session
+from instrument import instrumented, phase, annotate
+from index import REGISTER_SQL, LOGIN_SQL, LOGIN_SESSION_SQL, LOGOUT_SQL, player_response
+
+@instrumented('auth')
+async def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Async variant of the auth handler on a shared asyncpg pool, for long-lived hosts
+    Args: event with httpMethod, body (action, username, password, email for register), bearer token header for logout
+    Returns: HTTP response with player data or error, identical to index.handler
+    '''
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Auth-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+
+    with phase('decode'):
+        body_data = json.loads(event.get('body', '{}'))
+    action = body_data.get('action')
+    annotate(action=action)
+
+    pool = await get_pool()
+    with phase('connect'):
+        conn = await pool.acquire()
+
+    try:
+        if action == 'register':
+            username = body_data.get('username', '').strip()
+            password = body_data.get('password', '')
+            email = body_data.get('email', '').strip()
+            avatar = body_data.get('avatar', '🧙')
+
+            if not username or not password or not email:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Заполни все поля'})
+                }
+
+            password_hash = hashlib.sha256(password.encode()).hexdigest()
+            token = secrets.token_urlsafe(32)
+
+            player = await fetchrow(conn, REGISTER_SQL, (username, password_hash, email, avatar, hash_token(token), SESSION_TTL_DAYS))
+            return player_response(token, player)
+
+        elif action == 'login':
+            username = body_data.get('username', '').strip()
+            password = body_data.get('password', '')
+
+            if not username or not password:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Введи логин и пароль'})
+                }
+
+            password_hash = hashlib.sha256(password.encode()).hexdigest()
+            player = await fetchrow(conn, LOGIN_SQL, (username, password_hash))
+
+            if not player:
+                return {
+                    'statusCode': 401,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Неверный логин или пароль'})
+                }
+
+            token = secrets.token_urlsafe(32)
+            await execute(conn, LOGIN_SESSION_SQL, {'player_id': player[0], 'token_hash': hash_token(token), 'days': SESSION_TTL_DAYS})
+            return player_response(token, player)
+
+        elif action == 'logout':
+            token = bearer_token(event)
+            if token:
+                await execute(conn, LOGOUT_SQL, (hash_token(token),))
+                forget_session(token)
+
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': True})
+            }
+
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Unknown action'})
+        }
+
+    finally:
+        await pool.release(conn)
@@ -1,14 +1,74 @@
 import json
-import os
 import hashlib
 import secrets
-from typing import Dict, Any
-import psycopg2
+from typing import Dict, Any, Tuple
+from db import get_pool
+from sessions import SESSION_TTL_DAYS, hash_token, bearer_token, forget_session
+from instrument import instrumented, phase, annotate, connection_factory
 
+REGISTER_SQL = '''
+WITH player AS (
+    INSERT INTO t_p64683754_best_game_analysis.players (username, password_hash, email, avatar)
+    VALUES (%s, %s, %s, %s)
+    RETURNING id, username, coins, gems, level, experience, health, max_health, attack, defense, avatar
+), stats AS (
+    INSERT INTO t_p64683754_best_game_analysis.player_effective_stats (player_id, attack, defense, max_health)
+    SELECT id, attack, defense, max_health FROM player
+), session AS (
+    INSERT INTO t_p64683754_best_game_analysis.sessions (token_hash, player_id, expires_at)
+    SELECT %s, id, NOW() + make_interval(days => %s) FROM player
+)
+SELECT id, username, coins, gems, level, experience, health, max_health, attack, defense, avatar FROM player
+'''
+
+LOGIN_SQL = '''
+SELECT p.id, p.username, p.coins, p.gems, p.level, p.experience, p.health,
+       COALESCE(e.max_health, p.max_health), COALESCE(e.attack, p.attack), COALESCE(e.defense, p.defense), p.avatar
+FROM t_p64683754_best_game_analysis.players p
+LEFT JOIN t_p64683754_best_game_analysis.player_effective_stats e ON e.player_id = p.id
+WHERE p.username = %s AND p.password_hash = %s
+'''
+
+LOGIN_SESSION_SQL = '''
+WITH online AS (
+    UPDATE t_p64683754_best_game_analysis.players SET online = true, last_seen = NOW() WHERE id = %(player_id)s
+), stale AS (
+    DELETE FROM t_p64683754_best_game_analysis.sessions
+    WHERE player_id = %(player_id)s AND (expires_at < NOW() OR revoked_at IS NOT NULL)
+)
+INSERT INTO t_p64683754_best_game_analysis.sessions (token_hash, player_id, expires_at)
+VALUES (%(token_hash)s, %(player_id)s, NOW() + make_interval(days => %(days)s))
+'''
+
+LOGOUT_SQL = 'UPDATE t_p64683754_best_game_analysis.sessions SET revoked_at = NOW() WHERE token_hash = %s AND revoked_at IS NULL'
+
+def player_response(token: str, player: Tuple) -> Dict[str, Any]:
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({
+            'token': token,
+            'player': {
+                'id': player[0],
+                'username': player[1],
+                'coins': player[2],
+                'gems': player[3],
+                'level': player[4],
+                'experience': player[5],
+                'health': player[6],
+                'maxHealth': player[7],
+                'attack': player[8],
+                'defense': player[9],
+                'avatar': player[10]
+            }
+        })
+    }
+
+@instrumented('auth')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Business: Player authentication and registration
-    Args: event with httpMethod, body (username, password, email for register)
+    Business: Player authentication, registration and logout (session revocation)
+    Args: event with httpMethod, body (action, username, password, email for register), bearer token header for logout
     Returns: HTTP response with player data or error
     '''
     method: str = event.get('httpMethod', 'GET')
@@ -19,19 +79,22 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Auth-Token',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    pool = get_pool(connection_factory())
+    with phase('connect'):
+        conn = pool.acquire()
     cur = conn.cursor()
     
     try:
-        body_data = json.loads(event.get('body', '{}'))
+        with phase('decode'):
+            body_data = json.loads(event.get('body', '{}'))
         action = body_data.get('action')
+        annotate(action=action)
         
         if action == 'register':
             username = body_data.get('username', '').strip()
@@ -49,33 +112,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             password_hash = hashlib.sha256(password.encode()).hexdigest()
             token = secrets.token_urlsafe(32)
             
-            cur.execute(
-                "INSERT INTO t_p64683754_best_game_analysis.players (username, password_hash, email, avatar) VALUES (%s, %s, %s, %s) RETURNING id, username, coins, gems, level, experience, health, max_health, attack, defense, avatar",
-                (username, password_hash, email, avatar)
-            )
+            cur.execute(REGISTER_SQL, (username, password_hash, email, avatar, hash_token(token), SESSION_TTL_DAYS))
             player = cur.fetchone()
             conn.commit()
             
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'token': token,
-                    'player': {
-                        'id': player[0],
-                        'username': player[1],
-                        'coins': player[2],
-                        'gems': player[3],
-                        'level': player[4],
-                        'experience': player[5],
-                        'health': player[6],
-                        'maxHealth': player[7],
-                        'attack': player[8],
-                        'defense': player[9],
-                        'avatar': player[10]
-                    }
-                })
-            }
+            return player_response(token, player)
         
         elif action == 'login':
             username = body_data.get('username', '').strip()
@@ -90,10 +131,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             password_hash = hashlib.sha256(password.encode()).hexdigest()
             
-            cur.execute(
-                "SELECT id, username, coins, gems, level, experience, health, max_health, attack, defense, avatar FROM t_p64683754_best_game_analysis.players WHERE username = %s AND password_hash = %s",
-                (username, password_hash)
-            )
+            cur.execute(LOGIN_SQL, (username, password_hash))
             player = cur.fetchone()
             
             if not player:
@@ -103,30 +141,24 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'error': 'Неверный логин или пароль'})
                 }
             
-            cur.execute("UPDATE t_p64683754_best_game_analysis.players SET online = true, last_seen = NOW() WHERE id = %s", (player[0],))
+            token = secrets.token_urlsafe(32)
+            
+            cur.execute(LOGIN_SESSION_SQL, {'player_id': player[0], 'token_hash': hash_token(token), 'days': SESSION_TTL_DAYS})
             conn.commit()
             
-            token = secrets.token_urlsafe(32)
+            return player_response(token, player)
+        
+        elif action == 'logout':
+            token = bearer_token(event)
+            if token:
+                cur.execute(LOGOUT_SQL, (hash_token(token),))
+                conn.commit()
+                forget_session(token)
             
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'token': token,
-                    'player': {
-                        'id': player[0],
-                        'username': player[1],
-                        'coins': player[2],
-                        'gems': player[3],
-                        'level': player[4],
-                        'experience': player[5],
-                        'health': player[6],
-                        'maxHealth': player[7],
-                        'attack': player[8],
-                        'defense': player[9],
-                        'avatar': player[10]
-                    }
-                })
+                'body': json.dumps({'success': True})
             }
         
         return {
@@ -137,4 +169,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        pool.release(conn)
\ No newline at end of file
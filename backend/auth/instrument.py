@@ -0,0 +1,286 @@
+import os
+import sys
+import json
+import time
+import random
+import inspect
+import threading
+import functools
+import contextvars
+from collections import Counter
+from typing import Dict, Any, Optional, Callable
+import psycopg2.extensions
+
+LOG_ENABLED = os.environ.get('INSTRUMENT_LOG', '1') != '0'
+PROFILE_RATE = float(os.environ.get('INSTRUMENT_PROFILE_RATE', '0'))
+PROFILE_INTERVAL = float(os.environ.get('INSTRUMENT_PROFILE_INTERVAL_MS', '2')) / 1000
+PROFILE_TOP = int(os.environ.get('INSTRUMENT_PROFILE_TOP', '10'))
+SQL_PREVIEW_LENGTH = 120
+
+_current: 'contextvars.ContextVar[Optional[Trace]]' = contextvars.ContextVar('trace', default=None)
+_cold = True
+
+
+class Trace:
+    '''
+    Business: Timing and round-trip counters of one handler invocation
+    Args: function name
+    Returns: mutable record filled by phases, traced cursors and connections
+    '''
+
+    __slots__ = ('function', 'phases', 'fields', 'executes', 'execute_ms', 'commits', 'rollbacks', 'commit_ms',
+                 'slowest_ms', 'slowest_sql')
+
+    def __init__(self, function: str):
+        self.function = function
+        self.phases: Dict[str, float] = {}
+        self.fields: Dict[str, Any] = {}
+        self.executes = 0
+        self.execute_ms = 0.0
+        self.commits = 0
+        self.rollbacks = 0
+        self.commit_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_sql: Optional[str] = None
+
+    def record_execute(self, query: Any, elapsed_ms: float) -> None:
+        self.executes += 1
+        self.execute_ms += elapsed_ms
+        if elapsed_ms > self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_sql = query
+
+    def to_dict(self) -> Dict[str, Any]:
+        slowest = self.slowest_sql
+        if isinstance(slowest, bytes):
+            slowest = slowest.decode('utf-8', 'replace')
+        return {
+            'phases_ms': {name: round(value, 3) for name, value in self.phases.items()},
+            'db': {
+                'executes': self.executes,
+                'execute_ms': round(self.execute_ms, 3),
+                'commits': self.commits,
+                'rollbacks': self.rollbacks,
+                'commit_ms': round(self.commit_ms, 3),
+                'slowest_ms': round(self.slowest_ms, 3),
+                'slowest_sql': ' '.join(slowest.split())[:SQL_PREVIEW_LENGTH] if slowest else None
+            }
+        }
+
+
+def record_execute(query: Any, elapsed_ms: float) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.record_execute(query, elapsed_ms)
+
+
+def record_commit(elapsed_ms: float) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.commits += 1
+        trace.commit_ms += elapsed_ms
+
+
+def record_rollback() -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.rollbacks += 1
+
+
+def tracing() -> bool:
+    return _current.get() is not None
+
+
+class TracedCursor(psycopg2.extensions.cursor):
+    def execute(self, query: Any, vars: Any = None) -> Any:
+        if not tracing():
+            return super().execute(query, vars)
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_execute(query, (time.perf_counter() - started) * 1000)
+
+
+class TracedConnection(psycopg2.extensions.connection):
+    '''
+    Business: psycopg2 connection whose cursors, commits and rollbacks report to the active trace
+    Args: same as psycopg2.connect
+    Returns: connection usable anywhere a plain one is
+    '''
+
+    def cursor(self, *args: Any, **kwargs: Any) -> Any:
+        kwargs.setdefault('cursor_factory', TracedCursor)
+        return super().cursor(*args, **kwargs)
+
+    def commit(self) -> None:
+        if not tracing():
+            return super().commit()
+        started = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            record_commit((time.perf_counter() - started) * 1000)
+
+    def rollback(self) -> None:
+        record_rollback()
+        super().rollback()
+
+
+class _Phase:
+    __slots__ = ('name', 'trace', 'started')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.trace = _current.get()
+        if self.trace is not None:
+            self.started = time.perf_counter()
+
+    def __exit__(self, *exc: Any) -> None:
+        if self.trace is not None:
+            elapsed_ms = (time.perf_counter() - self.started) * 1000
+            self.trace.phases[self.name] = self.trace.phases.get(self.name, 0.0) + elapsed_ms
+
+
+def phase(name: str) -> _Phase:
+    return _Phase(name)
+
+
+def annotate(**fields: Any) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.fields.update(fields)
+
+
+def connection_factory() -> Any:
+    return TracedConnection if LOG_ENABLED else None
+
+
+class Sampler:
+    '''
+    Business: Background thread sampling the stack of one thread at a fixed interval
+    Args: thread_id to sample, interval in seconds
+    Returns: collapsed stacks (outermost first, ';'-joined) with sample counts via stop()
+    '''
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self) -> 'Sampler':
+        self._thread.start()
+        return self
+
+    def stop(self) -> Dict[str, Any]:
+        self._stop.set()
+        self._thread.join()
+        return {
+            'interval_ms': self.interval * 1000,
+            'samples': sum(self.samples.values()),
+            'stacks': [{'stack': stack, 'count': count} for stack, count in self.samples.most_common(PROFILE_TOP)]
+        }
+
+
+def emit(record: Dict[str, Any]) -> None:
+    sys.stdout.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+    sys.stdout.flush()
+
+
+class _Invocation:
+    __slots__ = ('function', 'event', 'context', 'cold', 'sampler', 'trace', 'token', 'started')
+
+    def __init__(self, function: str, event: Dict[str, Any], context: Any):
+        global _cold
+        self.function = function
+        self.event = event
+        self.context = context
+        self.cold = _cold
+        _cold = False
+        self.sampler = None
+        if PROFILE_RATE > 0 and random.random() < PROFILE_RATE:
+            self.sampler = Sampler(threading.get_ident(), PROFILE_INTERVAL).start()
+        self.trace = Trace(function)
+        self.token = _current.set(self.trace)
+        self.started = time.perf_counter()
+
+    def finish(self, status: Optional[int], error: Optional[str]) -> None:
+        duration_ms = (time.perf_counter() - self.started) * 1000
+        _current.reset(self.token)
+        record = {
+            'event': 'invocation',
+            'function': self.function,
+            'request_id': getattr(self.context, 'request_id', None),
+            'method': self.event.get('httpMethod'),
+            'status': status,
+            'cold': self.cold,
+            'duration_ms': round(duration_ms, 3)
+        }
+        record.update(self.trace.fields)
+        record.update(self.trace.to_dict())
+        if error:
+            record['error'] = error
+        if self.sampler is not None:
+            record['profile'] = self.sampler.stop()
+        emit(record)
+
+
+def instrumented(function: str) -> Callable:
+    '''
+    Business: Wrap a cloud function handler (sync or async) to log one JSON line per invocation
+    Args: function name used in the log line
+    Returns: decorator; the handler is returned untouched when INSTRUMENT_LOG=0
+    '''
+    def decorate(handler: Callable) -> Callable:
+        if not LOG_ENABLED:
+            return handler
+
+        if inspect.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def async_wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+                invocation = _Invocation(function, event, context)
+                status, error = 500, None
+                try:
+                    response = await handler(event, context)
+                    status = response.get('statusCode', 200) if isinstance(response, dict) else None
+                    return response
+                except Exception as exc:
+                    error = type(exc).__name__
+                    raise
+                finally:
+                    invocation.finish(status, error)
+
+            return async_wrapper
+
+        @functools.wraps(handler)
+        def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+            invocation = _Invocation(function, event, context)
+            status, error = 500, None
+            try:
+                response = handler(event, context)
+                status = response.get('statusCode', 200) if isinstance(response, dict) else None
+                return response
+            except Exception as exc:
+                error = type(exc).__name__
+                raise
+            finally:
+                invocation.finish(status, error)
+
+        return wrapper
+
+    return decorate
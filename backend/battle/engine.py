@@ -0,0 +1,116 @@
+from typing import Dict, Any, List, Optional
+import numpy as np
+
+LEVEL_SPREAD = 1
+ARTIFACT_DROP_CHANCE = 0.1
+DEFEAT_COINS_PENALTY = 50
+SIMULATE_CHUNK_FIGHTS = 100_000
+
+
+def fight_outcome(p_attack: Any, p_defense: Any, p_health: Any,
+                  m_attack: Any, m_defense: Any, m_health: Any) -> Dict[str, Any]:
+    '''
+    Business: Resolve fights to the end, player strikes first each turn
+    Args: player and mob stats as ints or equally shaped numpy arrays
+    Returns: dict with win, turns, damage_dealt, damage_received (same shape as input)
+    '''
+    player_hit = np.maximum(1, np.subtract(p_attack, m_defense))
+    mob_hit = np.maximum(1, np.subtract(m_attack, p_defense))
+    turns_to_kill_mob = -(-np.asarray(m_health) // player_hit)
+    turns_to_kill_player = -(-np.maximum(1, p_health) // mob_hit)
+    win = turns_to_kill_mob <= turns_to_kill_player
+    turns = np.where(win, turns_to_kill_mob, turns_to_kill_player)
+    damage_dealt = np.where(win, m_health, np.minimum(m_health, turns * player_hit))
+    damage_received = np.where(win, (turns - 1) * mob_hit, p_health)
+    return {'win': win, 'turns': turns, 'damage_dealt': damage_dealt, 'damage_received': damage_received}
+
+
+def pick_mob_index(mob_levels: np.ndarray, target_levels: Any) -> Any:
+    '''
+    Business: Choose the strongest mob not above the target level
+    Args: mob_levels sorted ascending, target_levels int or array
+    Returns: index (or array of indexes) into mob_levels
+    '''
+    return np.maximum(0, np.searchsorted(mob_levels, target_levels, side='right') - 1)
+
+
+def experience_reward(mob_level: int, is_boss: bool) -> int:
+    return mob_level * (50 if is_boss else 10)
+
+
+def weekly_score_reward(is_boss: bool) -> int:
+    return 100 if is_boss else 10
+
+
+def apply_experience(level: int, experience: int, gained: int) -> Dict[str, int]:
+    experience += gained
+    if experience >= level * 100:
+        return {'level': level + 1, 'experience': experience - level * 100}
+    return {'level': level, 'experience': experience}
+
+
+def mobs_to_arrays(mobs: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    ordered = sorted(mobs, key=lambda m: m['level'])
+    return {
+        'level': np.array([m['level'] for m in ordered], dtype=np.int64),
+        'health': np.array([m['health'] for m in ordered], dtype=np.int64),
+        'attack': np.array([m['attack'] for m in ordered], dtype=np.int64),
+        'defense': np.array([m['defense'] for m in ordered], dtype=np.int64)
+    }
+
+
+def simulate_sweep(mobs: List[Dict[str, Any]], levels: List[int], gear: List[Dict[str, int]],
+                   trials: int, base: Dict[str, int], seed: Optional[int] = None,
+                   chunk_fights: int = SIMULATE_CHUNK_FIGHTS) -> List[Dict[str, Any]]:
+    '''
+    Business: Monte Carlo win rates for every (level, gear) pair, vectorized in chunks of bounded size
+    Args: mobs rows from lyrium_mobs, levels and gear profiles to sweep, trials per pair, base player stats,
+          chunk_fights caps how many fights are materialized at once (bounds peak memory)
+    Returns: list of per-pair aggregates (winRate, avgTurns, avgDamageReceived)
+    '''
+    rng = np.random.default_rng(seed)
+    table = mobs_to_arrays(mobs)
+
+    level_grid = np.repeat(np.asarray(levels, dtype=np.int64), len(gear))
+    attack_grid = np.tile(np.array([g.get('attack', 0) for g in gear], dtype=np.int64), len(levels)) + base['attack']
+    defense_grid = np.tile(np.array([g.get('defense', 0) for g in gear], dtype=np.int64), len(levels)) + base['defense']
+    health_grid = np.tile(np.array([g.get('health', 0) for g in gear], dtype=np.int64), len(levels)) + base['max_health']
+
+    pairs = len(level_grid)
+    wins = np.zeros(pairs, dtype=np.int64)
+    total_turns = np.zeros(pairs, dtype=np.int64)
+    total_received = np.zeros(pairs, dtype=np.int64)
+
+    trial_block = min(trials, chunk_fights)
+    pair_block = max(1, chunk_fights // trial_block)
+    for first in range(0, pairs, pair_block):
+        block = slice(first, min(pairs, first + pair_block))
+        count = block.stop - block.start
+        for done in range(0, trials, trial_block):
+            n = min(trial_block, trials - done)
+            player_level = np.repeat(level_grid[block], n)
+            target = np.maximum(1, player_level + rng.integers(-LEVEL_SPREAD, LEVEL_SPREAD + 1, size=count * n))
+            mob = pick_mob_index(table['level'], target)
+
+            outcome = fight_outcome(
+                np.repeat(attack_grid[block], n), np.repeat(defense_grid[block], n), np.repeat(health_grid[block], n),
+                table['attack'][mob], table['defense'][mob], table['health'][mob]
+            )
+
+            shape = (count, n)
+            wins[block] += outcome['win'].reshape(shape).sum(axis=1)
+            total_turns[block] += outcome['turns'].reshape(shape).sum(axis=1)
+            total_received[block] += outcome['damage_received'].reshape(shape).sum(axis=1)
+
+    results = []
+    for index in range(pairs):
+        profile = gear[index % len(gear)]
+        results.append({
+            'level': int(level_grid[index]),
+            'gear': profile,
+            'trials': trials,
+            'winRate': round(float(wins[index]) / trials, 4),
+            'avgTurns': round(float(total_turns[index]) / trials, 2),
+            'avgDamageReceived': round(float(total_received[index]) / trials, 2)
+        })
+    return results
@@ -0,0 +1,266 @@
+import json
+import random
+from typing import Dict, Any, List, Optional
+from db import get_pool
+from sessions import resolve_player
+from engine import (
+    LEVEL_SPREAD, ARTIFACT_DROP_CHANCE, DEFEAT_COINS_PENALTY,
+    fight_outcome, experience_reward, weekly_score_reward, apply_experience, simulate_sweep
+)
+
+SIMULATE_MAX_FIGHTS = 1_000_000
+SIMULATE_DEFAULT_TRIALS = 1000
+SIMULATE_MAX_LEVEL = 1000
+SIMULATE_MAX_STAT = 1_000_000
+INT4_MAX = 2 ** 31 - 1
+BASE_PLAYER_STATS = {'attack': 10, 'defense': 5, 'max_health': 100}
+
+MOB_COLUMNS = 'id, name, icon, level, is_boss, health, attack, defense, coins_reward, gems_reward, artifact_name'
+
+FIGHT_LOAD_SQL = f'''
+SELECT p.level, p.experience, p.health, e.max_health, e.attack, e.defense, p.coins, p.gems,
+       m.id, m.name, m.icon, m.level, m.is_boss, m.health, m.attack, m.defense, m.coins_reward, m.gems_reward, m.artifact_name
+FROM t_p64683754_best_game_analysis.players p
+JOIN t_p64683754_best_game_analysis.player_effective_stats e ON e.player_id = p.id
+CROSS JOIN LATERAL (
+    SELECT {MOB_COLUMNS}
+    FROM t_p64683754_best_game_analysis.lyrium_mobs
+    WHERE (%(mob_id)s IS NOT NULL AND id = %(mob_id)s)
+       OR (%(mob_id)s IS NULL AND level <= GREATEST(1, p.level + %(level_offset)s))
+    ORDER BY level DESC
+    LIMIT 1
+) m
+WHERE p.id = %(player_id)s
+FOR UPDATE OF p
+'''
+
+FIGHT_SETTLE_SQL = '''
+WITH settled AS (
+    UPDATE t_p64683754_best_game_analysis.players
+    SET level = %(level)s, experience = %(experience)s, health = %(health)s,
+        coins = GREATEST(0, coins + %(coins)s), gems = gems + %(gems)s
+    WHERE id = %(player_id)s
+    RETURNING level, experience, health, coins, gems
+), logged AS (
+    INSERT INTO t_p64683754_best_game_analysis.lyrium_battles
+        (player_id, mob_id, player_level, mob_level, result, damage_dealt, damage_received, rewards_coins, rewards_gems, artifact_received)
+    VALUES (%(player_id)s, %(mob_id)s, %(player_level)s, %(mob_level)s, %(result)s, %(damage_dealt)s, %(damage_received)s, %(coins)s, %(gems)s, %(artifact)s)
+    RETURNING id
+), weekly AS (
+    INSERT INTO t_p64683754_best_game_analysis.player_weekly_scores (week_start, player_id, score)
+    SELECT date_trunc('week', NOW())::date, %(player_id)s, %(weekly_score)s
+    WHERE %(weekly_score)s > 0
+    ON CONFLICT (week_start, player_id) DO UPDATE SET score = player_weekly_scores.score + EXCLUDED.score
+)
+SELECT s.level, s.experience, s.health, s.coins, s.gems, (SELECT id FROM logged)
+FROM settled s
+'''
+
+
+def resolve_fight(cur: Any, player_id: Any, mob_id: Any) -> Optional[Dict[str, Any]]:
+    '''
+    Business: Fight one mob from lyrium_mobs, settle rewards and log the battle
+    Args: cur inside an open transaction, player_id, optional mob_id (otherwise picked near the player level)
+    Returns: response payload, or None when player or mob does not exist
+    '''
+    cur.execute(FIGHT_LOAD_SQL, {
+        'player_id': player_id,
+        'mob_id': mob_id,
+        'level_offset': random.randint(-LEVEL_SPREAD, LEVEL_SPREAD)
+    })
+    row = cur.fetchone()
+    if not row:
+        return None
+    level, experience, health, max_health, attack, defense = row[0:6]
+    mob = dict(zip(['id', 'name', 'icon', 'level', 'isBoss', 'health', 'attack', 'defense', 'coinsReward', 'gemsReward', 'artifactName'], row[8:19]))
+
+    outcome = fight_outcome(attack, defense, health, mob['attack'], mob['defense'], mob['health'])
+    won = bool(outcome['win'])
+
+    rewards = {'coins': -DEFEAT_COINS_PENALTY, 'gems': 0, 'experience': 0, 'weeklyScore': 0, 'artifact': None}
+    progress = {'level': level, 'experience': experience}
+    remaining_health = max_health
+    if won:
+        rewards['coins'] = mob['coinsReward']
+        rewards['gems'] = mob['gemsReward']
+        rewards['experience'] = experience_reward(mob['level'], mob['isBoss'])
+        rewards['weeklyScore'] = weekly_score_reward(mob['isBoss'])
+        if mob['isBoss'] and mob['artifactName'] and random.random() < ARTIFACT_DROP_CHANCE:
+            rewards['artifact'] = mob['artifactName']
+        progress = apply_experience(level, experience, rewards['experience'])
+        remaining_health = health - int(outcome['damage_received'])
+
+    cur.execute(FIGHT_SETTLE_SQL, {
+        'player_id': player_id,
+        'mob_id': mob['id'],
+        'player_level': level,
+        'mob_level': mob['level'],
+        'level': progress['level'],
+        'experience': progress['experience'],
+        'health': remaining_health,
+        'coins': rewards['coins'],
+        'gems': rewards['gems'],
+        'weekly_score': rewards['weeklyScore'],
+        'result': 'win' if won else 'loss',
+        'damage_dealt': int(outcome['damage_dealt']),
+        'damage_received': int(outcome['damage_received']),
+        'artifact': rewards['artifact']
+    })
+    settled = cur.fetchone()
+
+    return {
+        'battleId': settled[5],
+        'result': 'win' if won else 'loss',
+        'turns': int(outcome['turns']),
+        'damageDealt': int(outcome['damage_dealt']),
+        'damageReceived': int(outcome['damage_received']),
+        'mob': mob,
+        'rewards': rewards,
+        'player': {
+            'level': settled[0],
+            'experience': settled[1],
+            'health': settled[2],
+            'maxHealth': max_health,
+            'coins': settled[3],
+            'gems': settled[4]
+        }
+    }
+
+
+def parse_mob_id(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError('mobId')
+    mob_id = int(value)
+    if mob_id < 1 or mob_id > INT4_MAX:
+        raise ValueError('mobId')
+    return mob_id
+
+
+def parse_simulation(body_data: Dict[str, Any]) -> Dict[str, Any]:
+    levels = body_data.get('levels')
+    if not levels:
+        level_range = body_data.get('levelRange') or [1, 50]
+        if not isinstance(level_range, list) or len(level_range) != 2 or not all(type(v) is int for v in level_range):
+            raise ValueError('levelRange')
+        if level_range[1] - level_range[0] >= SIMULATE_MAX_FIGHTS:
+            raise ValueError('levelRange')
+        levels = list(range(level_range[0], level_range[1] + 1))
+    gear: List[Dict[str, int]] = body_data.get('gear') or [{'attack': 0, 'defense': 0, 'health': 0}]
+    trials = body_data.get('trials', SIMULATE_DEFAULT_TRIALS)
+    seed = body_data.get('seed')
+
+    if not isinstance(levels, list) or not levels or not all(type(level) is int and 1 <= level <= SIMULATE_MAX_LEVEL for level in levels):
+        raise ValueError('levels')
+    if not isinstance(gear, list) or not all(
+        isinstance(g, dict) and all(type(g.get(k, 0)) is int and abs(g.get(k, 0)) <= SIMULATE_MAX_STAT for k in ('attack', 'defense', 'health'))
+        for g in gear
+    ):
+        raise ValueError('gear')
+    if type(trials) is not int or trials < 1 or len(levels) * len(gear) * trials > SIMULATE_MAX_FIGHTS:
+        raise ValueError('trials')
+    if seed is not None and (type(seed) is not int or seed < 0):
+        raise ValueError('seed')
+    return {'levels': levels, 'gear': gear, 'trials': trials, 'seed': seed}
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Authoritative mob fights against lyrium_mobs and batch balance simulation
+    Args: event with httpMethod, bearer token header, body (action=fight with mobId; action=simulate with levels, levelRange, gear, trials, seed)
+    Returns: HTTP response with battle result or per-level win rates
+    '''
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Auth-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+
+    body_data = json.loads(event.get('body', '{}'))
+    action = body_data.get('action')
+
+    if action == 'simulate':
+        try:
+            simulation = parse_simulation(body_data)
+        except (ValueError, TypeError, IndexError):
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Неверные параметры симуляции'})
+            }
+    elif action == 'fight':
+        try:
+            mob_id = parse_mob_id(body_data.get('mobId'))
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Неверный противник'})
+            }
+    else:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Unknown action'})
+        }
+
+    pool = get_pool()
+    conn = pool.acquire()
+    cur = conn.cursor()
+
+    if action == 'simulate':
+        try:
+            cur.execute(f"SELECT {MOB_COLUMNS} FROM t_p64683754_best_game_analysis.lyrium_mobs")
+            mobs = [{'level': r[3], 'health': r[5], 'attack': r[6], 'defense': r[7]} for r in cur.fetchall()]
+            conn.rollback()
+        finally:
+            cur.close()
+            pool.release(conn)
+
+        results = simulate_sweep(
+            mobs, simulation['levels'], simulation['gear'], simulation['trials'],
+            BASE_PLAYER_STATS, simulation['seed']
+        )
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'results': results})
+        }
+
+    try:
+        player_id = resolve_player(cur, event)
+        if player_id is None:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'})
+            }
+
+        result = resolve_fight(cur, player_id, mob_id)
+        if result is None:
+            conn.rollback()
+            return {
+                'statusCode': 404,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Игрок или противник не найден'})
+            }
+        conn.commit()
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(result)
+        }
+
+    finally:
+        cur.close()
+        pool.release(conn)
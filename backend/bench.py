@@ -0,0 +1,635 @@
+import argparse
+import glob
+import importlib
+import importlib.util
+import asyncio
+import contextvars
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Tuple
+import psycopg2
+import psycopg2.extensions
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATIONS_DIR = os.path.join(os.path.dirname(BACKEND_DIR), 'db_migrations')
+SCHEMA = 't_p64683754_best_game_analysis'
+FUNCTION_MODULES = ('index', 'db', 'sessions', 'instrument', 'aiodb', 'aio', 'seed')
+SCENARIOS = ('auth_register', 'auth_login', 'shop_catalog', 'shop_catalog_filtered', 'shop_buy')
+CATALOG_FILTERS = (
+    {'category': 'weapon', 'sort': 'price_coins', 'limit': '20'},
+    {'rarity': 'rare', 'sort': 'rarity', 'limit': '20'},
+    {'currency': 'gems', 'sort': 'price_gems', 'limit': '20'},
+    {'minAttack': '10', 'sort': 'price_coins', 'limit': '20'}
+)
+
+BUY_MIN_PRICE = 50
+
+_round_trips = threading.local()
+_async_round_trips: 'contextvars.ContextVar[List[int]]' = contextvars.ContextVar('round_trips')
+
+
+def round_trips() -> int:
+    return getattr(_round_trips, 'count', 0)
+
+
+def count_round_trip() -> None:
+    _round_trips.count = round_trips() + 1
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    def execute(self, query: Any, vars: Any = None) -> Any:
+        count_round_trip()
+        return super().execute(query, vars)
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    '''
+    Business: psycopg2 connection that counts statements, commits and rollbacks sent to the server
+    Args: same as psycopg2.connect
+    Returns: connection whose cursors report every execute to the thread-local counter
+    '''
+
+    def cursor(self, *args: Any, **kwargs: Any) -> Any:
+        kwargs.setdefault('cursor_factory', CountingCursor)
+        return super().cursor(*args, **kwargs)
+
+    def commit(self) -> None:
+        if self.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            count_round_trip()
+        super().commit()
+
+    def rollback(self) -> None:
+        if self.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            count_round_trip()
+        super().rollback()
+
+
+def load_function(name: str, dsn: str, pool_size: int) -> Dict[str, Any]:
+    '''
+    Business: Import a cloud function the way its runtime does, isolated from the other functions
+    Args: name of the directory under backend/, dsn of the benchmark database, pool_size of its connection pool
+    Returns: dict with the function's index, db and (if present) seed, aio and aiodb modules
+    '''
+    path = os.path.join(BACKEND_DIR, name)
+    saved = {module: sys.modules.pop(module) for module in FUNCTION_MODULES if module in sys.modules}
+    sys.path.insert(0, path)
+    try:
+        loaded = {'index': importlib.import_module('index'), 'db': sys.modules['db']}
+        if os.path.exists(os.path.join(path, 'seed.py')):
+            loaded['seed'] = importlib.import_module('seed')
+        if os.path.exists(os.path.join(path, 'aio.py')) and importlib.util.find_spec('asyncpg') is not None:
+            loaded['aio'] = importlib.import_module('aio')
+            loaded['aiodb'] = sys.modules['aiodb']
+    finally:
+        sys.path.remove(path)
+        for module in FUNCTION_MODULES:
+            sys.modules.pop(module, None)
+        sys.modules.update(saved)
+
+    install_pool(loaded['db'], dsn, pool_size)
+    return loaded
+
+
+def install_pool(db: Any, dsn: str, pool_size: int) -> None:
+    '''
+    Business: Give a function a fresh connection pool whose connections count round-trips
+    Args: db module of the function, dsn, pool_size
+    Returns: nothing; idle connections of the previous pool are closed
+    '''
+    class CountingPool(db.ConnectionPool):
+        def _connect(self) -> Any:
+            conn = psycopg2.connect(self.dsn, connection_factory=CountingConnection)
+            with self._lock:
+                self._counters['connected'] += 1
+            return conn
+
+    previous = db._pool
+    db._pool = CountingPool(dsn, max_size=pool_size)
+    if previous is not None:
+        close_idle(previous)
+
+
+def close_idle(pool: Any) -> None:
+    with pool._lock:
+        idle, pool._idle = pool._idle, []
+    for conn in idle:
+        conn.close()
+
+
+def call(handler: Any, event: Dict[str, Any]) -> Tuple[float, int, int, Dict[str, Any]]:
+    _round_trips.count = 0
+    started = time.perf_counter()
+    response = handler(event, None)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    return elapsed_ms, response['statusCode'], round_trips(), response
+
+
+async def call_async(handler: Any, event: Dict[str, Any]) -> Tuple[float, int, int, Dict[str, Any]]:
+    trips = [0]
+    _async_round_trips.set(trips)
+    started = time.perf_counter()
+    response = await handler(event, None)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    return elapsed_ms, response['statusCode'], trips[0], response
+
+
+def start_postgres(pg_bin: Optional[str], workdir: str) -> Tuple[str, Any]:
+    '''
+    Business: Start a throwaway Postgres cluster on a unix socket inside workdir
+    Args: pg_bin directory with initdb/pg_ctl (defaults to PATH or pg_config --bindir), workdir for data and socket
+    Returns: dsn of the cluster and a callable that stops it
+    '''
+    if pg_bin is None:
+        pg_ctl = shutil.which('pg_ctl')
+        if pg_ctl:
+            pg_bin = os.path.dirname(pg_ctl)
+        elif shutil.which('pg_config'):
+            pg_bin = subprocess.check_output(['pg_config', '--bindir'], text=True).strip()
+        else:
+            raise SystemExit('pg_ctl not found: pass --pg-bin or --dsn')
+
+    data_dir = os.path.join(workdir, 'data')
+    subprocess.run(
+        [os.path.join(pg_bin, 'initdb'), '-D', data_dir, '-U', 'postgres', '--auth=trust', '-E', 'UTF8'],
+        check=True, stdout=subprocess.DEVNULL
+    )
+    subprocess.run(
+        [os.path.join(pg_bin, 'pg_ctl'), '-D', data_dir, '-l', os.path.join(workdir, 'postgres.log'), '-w',
+         '-o', f"-k {workdir} -c listen_addresses='' -c max_connections=300", 'start'],
+        check=True, stdout=subprocess.DEVNULL
+    )
+
+    def stop() -> None:
+        subprocess.run(
+            [os.path.join(pg_bin, 'pg_ctl'), '-D', data_dir, '-m', 'fast', '-w', 'stop'],
+            check=False, stdout=subprocess.DEVNULL
+        )
+
+    return f'postgresql://postgres@/postgres?host={workdir}', stop
+
+
+def apply_migrations(dsn: str) -> List[str]:
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f'SET search_path TO {SCHEMA}')
+        applied = []
+        for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, 'V*.sql'))):
+            with open(path, encoding='utf-8') as migration:
+                cur.execute(migration.read())
+            applied.append(os.path.basename(path))
+        return applied
+    finally:
+        cur.close()
+        conn.close()
+
+
+def query(dsn: str, sql: str, params: Any = None) -> List[Any]:
+    conn = psycopg2.connect(dsn)
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        conn.rollback()
+        return rows
+    finally:
+        conn.close()
+
+
+def post(body: Dict[str, Any], token: Optional[str] = None) -> Dict[str, Any]:
+    event: Dict[str, Any] = {'httpMethod': 'POST', 'headers': {}, 'body': json.dumps(body)}
+    if token:
+        event['headers']['Authorization'] = f'Bearer {token}'
+    return event
+
+
+def register_players(auth: Any, prefix: str, count: int) -> List[Dict[str, Any]]:
+    players = []
+    for i in range(count):
+        username = f'{prefix}_p{i}'
+        response = auth.handler(post({
+            'action': 'register', 'username': username, 'password': 'bench-password', 'email': f'{username}@bench.local'
+        }), None)
+        if response['statusCode'] != 200:
+            raise RuntimeError(f'register {username} failed: {response["body"]}')
+        data = json.loads(response['body'])
+        players.append({'username': username, 'token': data['token'], 'id': data['player']['id'], 'coins': data['player']['coins']})
+    return players
+
+
+def prepare(scenario: str, functions: Dict[str, Any], dsn: str, prefix: str, requests: int, players: int,
+            buyers: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    '''
+    Business: Build the event stream for one scenario run and the state its correctness check needs
+    Args: scenario name, loaded functions, dsn, unique prefix of this run, number of requests, login players and buyers
+    Returns: list of events and a picklable expectation dict
+    '''
+    auth = functions['auth']['index']
+
+    if scenario == 'auth_register':
+        events = [
+            post({'action': 'register', 'username': f'{prefix}_r{i}', 'password': 'bench-password', 'email': f'{prefix}_r{i}@bench.local'})
+            for i in range(requests)
+        ]
+        return events, {'prefix': prefix}
+
+    if scenario == 'auth_login':
+        accounts = register_players(auth, prefix, players)
+        events = [
+            post({'action': 'login', 'username': accounts[i % len(accounts)]['username'], 'password': 'bench-password'})
+            for i in range(requests)
+        ]
+        ids = [account['id'] for account in accounts]
+        sessions = query(dsn, f'SELECT COUNT(*) FROM {SCHEMA}.sessions WHERE player_id = ANY(%s)', (ids,))[0][0]
+        return events, {'player_ids': ids, 'sessions_before': sessions}
+
+    if scenario == 'shop_catalog':
+        items = query(dsn, f'SELECT COUNT(*) FROM {SCHEMA}.items')[0][0]
+        return [{'httpMethod': 'GET', 'headers': {}} for _ in range(requests)], {'items': items}
+
+    if scenario == 'shop_catalog_filtered':
+        events = [
+            {'httpMethod': 'GET', 'headers': {}, 'queryStringParameters': CATALOG_FILTERS[i % len(CATALOG_FILTERS)]}
+            for i in range(requests)
+        ]
+        return events, {'limit': 20}
+
+    accounts = register_players(auth, prefix, buyers)
+    item_id, price = query(
+        dsn,
+        f'SELECT id, price_coins FROM {SCHEMA}.items WHERE price_coins >= %s AND price_gems = 0 ORDER BY price_coins, id LIMIT 1',
+        (BUY_MIN_PRICE,)
+    )[0]
+    events = [
+        post({'itemId': item_id, 'idempotencyKey': uuid.uuid4().hex}, accounts[i % len(accounts)]['token'])
+        for i in range(requests)
+    ]
+    return events, {
+        'player_ids': [account['id'] for account in accounts],
+        'start_coins': {account['id']: account['coins'] for account in accounts},
+        'price': price
+    }
+
+
+def check_response(scenario: str, status: int, response: Dict[str, Any], expect: Dict[str, Any]) -> Optional[str]:
+    if scenario == 'shop_buy':
+        if status == 400:
+            return None if json.loads(response['body']).get('error') == 'Недостаточно монет' else response['body']
+        if status != 200:
+            return f'status {status}'
+        data = json.loads(response['body'])
+        return 'negative balance' if data['coins'] < 0 or data['gems'] < 0 else None
+    if status not in (200, 304):
+        return f'status {status}'
+    if scenario == 'shop_catalog' and status == 200 and len(json.loads(response['body'])['items']) != expect['items']:
+        return 'catalog size mismatch'
+    if scenario == 'shop_catalog_filtered' and len(json.loads(response['body'])['items']) > expect['limit']:
+        return 'page over limit'
+    return None
+
+
+def verify(scenario: str, dsn: str, expect: Dict[str, Any], statuses: Dict[int, int], errors: List[str]) -> Dict[str, Any]:
+    '''
+    Business: Check the database state after a run against the responses the handlers returned
+    Args: scenario, dsn, expectation from prepare, status histogram, per-response errors
+    Returns: dict with passed flag and the figures that were compared
+    '''
+    result: Dict[str, Any] = {'response_errors': len(errors), 'sample_errors': errors[:5]}
+    ok = statuses.get(200, 0)
+
+    if scenario == 'auth_register':
+        created = query(dsn, f'SELECT COUNT(*) FROM {SCHEMA}.players WHERE username LIKE %s', (expect['prefix'] + '\\_r%',))[0][0]
+        result.update({'players_created': created, 'expected': ok})
+        result['passed'] = not errors and created == ok
+    elif scenario == 'auth_login':
+        sessions = query(dsn, f'SELECT COUNT(*) FROM {SCHEMA}.sessions WHERE player_id = ANY(%s)', (expect['player_ids'],))[0][0]
+        result.update({'sessions_created': sessions - expect['sessions_before'], 'expected': ok})
+        result['passed'] = not errors and sessions - expect['sessions_before'] == ok
+    elif scenario == 'shop_buy':
+        rows = query(dsn, f'''
+            SELECT p.id, p.coins, p.gems, (SELECT COUNT(*) FROM {SCHEMA}.purchases r WHERE r.player_id = p.id)
+            FROM {SCHEMA}.players p WHERE p.id = ANY(%s)
+        ''', (expect['player_ids'],))
+        negative = sum(1 for row in rows if row[1] < 0 or row[2] < 0)
+        purchases = sum(row[3] for row in rows)
+        drift = sum(1 for row in rows if expect['start_coins'][row[0]] - row[1] != row[3] * expect['price'])
+        result.update({'negative_balances': negative, 'purchases': purchases, 'expected': ok, 'balance_drift': drift})
+        result['passed'] = not errors and negative == 0 and drift == 0 and purchases == ok
+    else:
+        result['passed'] = not errors
+    return result
+
+
+def run_worker(function: str, dsn: str, scenario: str, events: List[Dict[str, Any]], expect: Dict[str, Any],
+               warmup: int, pool_size: int, barrier: Any, results: Any) -> None:
+    functions = {function: load_function(function, dsn, pool_size)}
+    handler = functions[function]['index'].handler
+    records = []
+    for event in events[:warmup]:
+        _, status, _, response = call(handler, event)
+        records.append((None, status, 0, check_response(scenario, status, response, expect)))
+    barrier.wait()
+    for event in events[warmup:]:
+        elapsed_ms, status, trips, response = call(handler, event)
+        records.append((elapsed_ms, status, trips, check_response(scenario, status, response, expect)))
+    results.put((time.monotonic(), records, functions[function]['db'].pool_stats()))
+
+
+def run_threads(functions: Dict[str, Any], dsn: str, function: str, scenario: str, shards: List[List[Dict[str, Any]]],
+                expect: Dict[str, Any], warmup: int) -> Tuple[float, List[Any], List[Dict[str, Any]]]:
+    install_pool(functions[function]['db'], dsn, len(shards))
+    handler = functions[function]['index'].handler
+    barrier = threading.Barrier(len(shards) + 1)
+    finished: List[Any] = []
+    lock = threading.Lock()
+
+    def work(events: List[Dict[str, Any]]) -> None:
+        records = []
+        for event in events[:warmup]:
+            _, status, _, response = call(handler, event)
+            records.append((None, status, 0, check_response(scenario, status, response, expect)))
+        barrier.wait()
+        for event in events[warmup:]:
+            elapsed_ms, status, trips, response = call(handler, event)
+            records.append((elapsed_ms, status, trips, check_response(scenario, status, response, expect)))
+        with lock:
+            finished.append((time.monotonic(), records))
+
+    threads = [threading.Thread(target=work, args=(shard,)) for shard in shards]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.monotonic()
+    for thread in threads:
+        thread.join()
+    ended = max(end for end, _ in finished)
+    return ended - started, [record for _, records in finished for record in records], [functions[function]['db'].pool_stats()]
+
+
+def run_processes(functions: Dict[str, Any], dsn: str, function: str, scenario: str, shards: List[List[Dict[str, Any]]],
+                  expect: Dict[str, Any], warmup: int) -> Tuple[float, List[Any], List[Dict[str, Any]]]:
+    close_idle(functions[function]['db'].get_pool())
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(len(shards) + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(target=run_worker, args=(function, dsn, scenario, shard, expect, warmup, 1, barrier, results))
+        for shard in shards
+    ]
+    for process in processes:
+        process.start()
+    barrier.wait()
+    started = time.monotonic()
+    finished = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    ended = max(end for end, _, _ in finished)
+    return ended - started, [record for _, records, _ in finished for record in records], [stats for _, _, stats in finished]
+
+
+def run_async(functions: Dict[str, Any], dsn: str, function: str, scenario: str, shards: List[List[Dict[str, Any]]],
+              expect: Dict[str, Any], warmup: int) -> Tuple[float, List[Any], List[Dict[str, Any]]]:
+    '''
+    Business: Drive aio.handler from one event loop with a concurrent task per worker
+    Args: same as run_threads; the asyncpg pool is capped at ASYNC_POOL_MAX_SIZE connections
+    Returns: elapsed seconds, per-request records and pool figures
+    '''
+    import asyncpg
+
+    class CountingConnection(asyncpg.Connection):
+        def _count(self) -> None:
+            trips = _async_round_trips.get(None)
+            if trips is not None:
+                trips[0] += 1
+
+        async def execute(self, query: str, *args: Any, **kwargs: Any) -> Any:
+            self._count()
+            return await super().execute(query, *args, **kwargs)
+
+        async def fetch(self, query: str, *args: Any, **kwargs: Any) -> Any:
+            self._count()
+            return await super().fetch(query, *args, **kwargs)
+
+        async def fetchrow(self, query: str, *args: Any, **kwargs: Any) -> Any:
+            self._count()
+            return await super().fetchrow(query, *args, **kwargs)
+
+    close_idle(functions[function]['db'].get_pool())
+    aiodb = functions[function]['aiodb']
+    handler = functions[function]['aio'].handler
+    pool_size = min(len(shards), aiodb.ASYNC_POOL_MAX_SIZE)
+
+    async def main() -> Tuple[float, List[Any], List[Dict[str, Any]]]:
+        await aiodb.close_pool()
+        pool = await asyncpg.create_pool(dsn, min_size=pool_size, max_size=pool_size, connection_class=CountingConnection)
+        aiodb._pool, aiodb._pool_loop, aiodb._pool_lock = pool, asyncio.get_running_loop(), asyncio.Lock()
+        ready = 0
+        started = 0.0
+        go = asyncio.Event()
+
+        async def work(events: List[Dict[str, Any]]) -> Tuple[float, List[Any]]:
+            nonlocal ready, started
+            records = []
+            for event in events[:warmup]:
+                _, status, _, response = await call_async(handler, event)
+                records.append((None, status, 0, check_response(scenario, status, response, expect)))
+            ready += 1
+            if ready == len(shards):
+                started = time.monotonic()
+                go.set()
+            await go.wait()
+            for event in events[warmup:]:
+                elapsed_ms, status, trips, response = await call_async(handler, event)
+                records.append((elapsed_ms, status, trips, check_response(scenario, status, response, expect)))
+            return time.monotonic(), records
+
+        tasks = [asyncio.ensure_future(work(shard)) for shard in shards]
+        finished = await asyncio.gather(*tasks)
+        await aiodb.close_pool()
+        ended = max(end for end, _ in finished)
+        return ended - started, [record for _, records in finished for record in records], [{'connected': pool_size}]
+
+    return asyncio.run(main())
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(scenario: str, mode: str, workers: int, elapsed: float, records: List[Any],
+              pools: List[Dict[str, Any]], correctness: Dict[str, Any]) -> Dict[str, Any]:
+    measured = [record for record in records if record[0] is not None]
+    latencies = sorted(record[0] for record in measured)
+    trips = [record[2] for record in measured]
+    statuses: Dict[str, int] = {}
+    for record in records:
+        statuses[str(record[1])] = statuses.get(str(record[1]), 0) + 1
+    return {
+        'scenario': scenario,
+        'mode': mode,
+        'workers': workers,
+        'requests': len(measured),
+        'warmup_requests': len(records) - len(measured),
+        'elapsed_s': round(elapsed, 4),
+        'rps': round(len(measured) / elapsed, 1) if elapsed > 0 else 0.0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            'p50': round(percentile(latencies, 0.50), 3),
+            'p95': round(percentile(latencies, 0.95), 3),
+            'p99': round(percentile(latencies, 0.99), 3),
+            'max': round(latencies[-1], 3) if latencies else 0.0
+        },
+        'round_trips_per_request': {
+            'mean': round(sum(trips) / len(trips), 3) if trips else 0.0,
+            'max': max(trips) if trips else 0
+        },
+        'statuses': statuses,
+        'pool': {
+            'connected': sum(stats['connected'] for stats in pools),
+            'reuse_ratio': round(sum(stats.get('reused', 0) for stats in pools) / max(1, sum(stats.get('acquired', 0) for stats in pools)), 4),
+            'acquire_ms_max': round(max(stats.get('acquire_ms_max', 0.0) for stats in pools), 3)
+        },
+        'correctness': correctness
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str) -> None:
+    with open(baseline_path, encoding='utf-8') as baseline_file:
+        baseline = {(r['scenario'], r['mode'], r['workers']): r for r in json.load(baseline_file)['results']}
+    for result in results:
+        before = baseline.get((result['scenario'], result['mode'], result['workers']))
+        if before is None:
+            continue
+        result['baseline'] = {
+            'rps_change_pct': round((result['rps'] / before['rps'] - 1) * 100, 1) if before['rps'] else None,
+            'p95_change_pct': round((result['latency_ms']['p95'] / before['latency_ms']['p95'] - 1) * 100, 1) if before['latency_ms']['p95'] else None,
+            'round_trips_change': round(result['round_trips_per_request']['mean'] - before['round_trips_per_request']['mean'], 3)
+        }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the auth and shop handlers against a local Postgres')
+    parser.add_argument('--dsn', help='use this existing database instead of starting a throwaway one (DATABASE_URL is never used implicitly)')
+    parser.add_argument('--reset', action='store_true', help='drop the schema of --dsn and re-apply db_migrations')
+    parser.add_argument('--pg-bin', help='directory with initdb and pg_ctl for the throwaway cluster')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--modes', default='threads,processes', help='any of threads, processes, async (needs asyncpg)')
+    parser.add_argument('--workers', default='1,8', help='comma-separated worker counts to sweep')
+    parser.add_argument('--requests', type=int, default=1000, help='measured requests per run')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per worker before the clock starts')
+    parser.add_argument('--players', type=int, default=20, help='accounts cycled through by the login scenario')
+    parser.add_argument('--buyers', type=int, default=5, help='accounts racing to spend their coins in the buy scenario')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    parser.add_argument('--baseline', help='earlier JSON output to compute deltas against')
+    args = parser.parse_args()
+    os.environ.setdefault('INSTRUMENT_LOG', '0')
+
+    scenarios = [name for name in args.scenarios.split(',') if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+    modes = [mode for mode in args.modes.split(',') if mode]
+    if set(modes) - {'threads', 'processes', 'async'}:
+        parser.error(f'unknown modes: {", ".join(sorted(set(modes) - {"threads", "processes", "async"}))}')
+    worker_counts = [int(count) for count in args.workers.split(',') if count]
+
+    workdir = None
+    stop = None
+    dsn = args.dsn
+    if dsn is None:
+        workdir = tempfile.mkdtemp(prefix='bench-pg-')
+        dsn, stop = start_postgres(args.pg_bin, workdir)
+
+    try:
+        migrations = apply_migrations(dsn) if args.reset or stop is not None else []
+        functions = {name: load_function(name, dsn, max(worker_counts)) for name in ('auth', 'shop')}
+        conn = psycopg2.connect(dsn)
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    seeded = functions['shop']['seed'].sync_catalog(cur)
+        finally:
+            conn.close()
+
+        run_id = uuid.uuid4().hex[:8]
+        results = []
+        for scenario in scenarios:
+            function = scenario.split('_')[0]
+            for mode in modes:
+                for workers in worker_counts:
+                    prefix = f'bench_{run_id}_{scenario}_{mode}_{workers}'
+                    total = args.requests + args.warmup * workers
+                    events, expect = prepare(scenario, functions, dsn, prefix, total, args.players, args.buyers)
+                    shards = [events[i::workers] for i in range(workers)]
+                    print(f'{scenario} {mode} x{workers}: {args.requests} requests', file=sys.stderr)
+                    if mode == 'async':
+                        elapsed, records, pools = run_async(functions, dsn, function, scenario, shards, expect, args.warmup)
+                    elif mode == 'threads':
+                        elapsed, records, pools = run_threads(functions, dsn, function, scenario, shards, expect, args.warmup)
+                    else:
+                        elapsed, records, pools = run_processes(functions, dsn, function, scenario, shards, expect, args.warmup)
+                    statuses: Dict[int, int] = {}
+                    for record in records:
+                        statuses[record[1]] = statuses.get(record[1], 0) + 1
+                    errors = [record[3] for record in records if record[3]]
+                    correctness = verify(scenario, dsn, expect, statuses, errors)
+                    results.append(summarize(scenario, mode, workers, elapsed, records, pools, correctness))
+
+        if args.baseline:
+            compare(results, args.baseline)
+
+        report = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'server_version': query(dsn, 'SHOW server_version')[0][0],
+                'cpu_count': os.cpu_count(),
+                'requests': args.requests,
+                'warmup': args.warmup,
+                'players': args.players,
+                'buyers': args.buyers,
+                'migrations_applied': migrations,
+                'catalog_sync': {'inserted': len(seeded['inserted']), 'updated': len(seeded['updated']), 'unchanged': seeded['unchanged']}
+            },
+            'results': results,
+            'passed': all(result['correctness']['passed'] for result in results)
+        }
+    finally:
+        if stop is not None:
+            stop()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            output_file.write(output + '\n')
+    else:
+        sys.stdout.write(output + '\n')
+    sys.exit(0 if report['passed'] else 1)
+
+
+if __name__ == '__main__':
+    main()
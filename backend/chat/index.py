@@ -0,0 +1,187 @@
+import json
+import os
+import time
+import select
+from typing import Dict, Any, List
+from db import get_pool
+from sessions import resolve_player
+
+CHANNEL = 'chat_messages'
+MESSAGE_MAX_LENGTH = 500
+PAGE_LIMIT = 50
+LONG_POLL_MAX_SECONDS = 25
+RETENTION_MESSAGES = int(os.environ.get('CHAT_RETENTION_MESSAGES', '5000'))
+RETENTION_DAYS = int(os.environ.get('CHAT_RETENTION_DAYS', '7'))
+PRUNE_EVERY = int(os.environ.get('CHAT_PRUNE_EVERY', '100'))
+
+# sends are serialized until commit so ids become visible in order and since_id readers never skip one
+SEND_SQL = f'''
+WITH ordered AS (
+    SELECT pg_advisory_xact_lock(hashtext('{CHANNEL}'))
+), msg AS (
+    INSERT INTO t_p64683754_best_game_analysis.chat_messages (player_id, message)
+    SELECT p.id, %(message)s
+    FROM ordered, t_p64683754_best_game_analysis.players p
+    WHERE p.id = %(player_id)s
+    RETURNING id, created_at
+)
+SELECT id, created_at, pg_notify('{CHANNEL}', id::text) FROM msg
+'''
+
+PRUNE_SQL = '''
+DELETE FROM t_p64683754_best_game_analysis.chat_messages
+WHERE id <= %(newest_id)s - %(keep)s
+   OR created_at < NOW() - make_interval(days => %(days)s)
+'''
+
+FETCH_COLUMNS = '''
+SELECT m.id, m.player_id, p.username, p.level, p.avatar, m.message, m.created_at
+FROM t_p64683754_best_game_analysis.chat_messages m
+JOIN t_p64683754_best_game_analysis.players p ON p.id = m.player_id
+'''
+
+FETCH_SINCE_SQL = FETCH_COLUMNS + 'WHERE m.id > %(since_id)s ORDER BY m.id LIMIT %(limit)s'
+
+FETCH_LATEST_SQL = f'SELECT * FROM ({FETCH_COLUMNS} ORDER BY m.id DESC LIMIT %(limit)s) latest ORDER BY id'
+
+
+def row_to_message(row: Any) -> Dict[str, Any]:
+    return {
+        'id': row[0],
+        'playerId': row[1],
+        'username': row[2],
+        'level': row[3],
+        'avatar': row[4],
+        'message': row[5],
+        'timestamp': row[6].isoformat()
+    }
+
+
+def fetch_since(conn: Any, cur: Any, since_id: int, limit: int) -> List[Dict[str, Any]]:
+    cur.execute(FETCH_SINCE_SQL, {'since_id': since_id, 'limit': limit})
+    rows = cur.fetchall()
+    conn.commit()
+    return [row_to_message(row) for row in rows]
+
+
+def wait_for_messages(conn: Any, cur: Any, since_id: int, limit: int, wait: float) -> List[Dict[str, Any]]:
+    '''
+    Business: Block until messages newer than since_id arrive or the wait expires
+    Args: conn, cur of a pooled connection, since_id cursor, limit, wait in seconds
+    Returns: new messages (possibly empty)
+    '''
+    cur.execute(f'LISTEN {CHANNEL}')
+    conn.commit()
+    try:
+        messages = fetch_since(conn, cur, since_id, limit)
+        deadline = time.monotonic() + wait
+        while not messages:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or select.select([conn], [], [], remaining) == ([], [], []):
+                break
+            conn.poll()
+            conn.notifies.clear()
+            messages = fetch_since(conn, cur, since_id, limit)
+        return messages
+    finally:
+        cur.execute(f'UNLISTEN {CHANNEL}')
+        conn.commit()
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Global chat - append messages, fetch only the delta after a cursor, optional long-poll
+    Args: event with httpMethod, queryStringParameters (sinceId, limit, wait), bearer token header, body (message)
+    Returns: HTTP response with new messages and the next cursor, or the stored message id
+    '''
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Auth-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+
+    if method == 'POST':
+        body_data = json.loads(event.get('body', '{}'))
+        message = str(body_data.get('message', '')).strip()
+        if not message or len(message) > MESSAGE_MAX_LENGTH:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Пустое или слишком длинное сообщение'})
+            }
+    else:
+        params = event.get('queryStringParameters') or {}
+        try:
+            since_id = int(params['sinceId']) if params.get('sinceId') else None
+            limit = min(PAGE_LIMIT, max(1, int(params.get('limit', PAGE_LIMIT))))
+            wait = min(LONG_POLL_MAX_SECONDS, max(0.0, float(params.get('wait', 0))))
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Неверные параметры чата'})
+            }
+
+    pool = get_pool()
+    conn = pool.acquire()
+    cur = conn.cursor()
+
+    try:
+        if method == 'POST':
+            player_id = resolve_player(cur, event)
+            if player_id is None:
+                return {
+                    'statusCode': 401,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Требуется авторизация'})
+                }
+
+            cur.execute(SEND_SQL, {'player_id': player_id, 'message': message})
+            row = cur.fetchone()
+            if not row:
+                conn.rollback()
+                return {
+                    'statusCode': 404,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Игрок не найден'})
+                }
+            conn.commit()
+
+            if row[0] % PRUNE_EVERY == 0:
+                cur.execute(PRUNE_SQL, {'newest_id': row[0], 'keep': RETENTION_MESSAGES, 'days': RETENTION_DAYS})
+                conn.commit()
+
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'id': row[0], 'timestamp': row[1].isoformat()})
+            }
+
+        if since_id is None:
+            cur.execute(FETCH_LATEST_SQL, {'limit': limit})
+            messages = [row_to_message(row) for row in cur.fetchall()]
+        elif wait > 0:
+            messages = wait_for_messages(conn, cur, since_id, limit, wait)
+        else:
+            messages = fetch_since(conn, cur, since_id, limit)
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'messages': messages,
+                'nextSinceId': messages[-1]['id'] if messages else since_id
+            })
+        }
+
+    finally:
+        cur.close()
+        pool.release(conn)
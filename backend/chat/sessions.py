@@ -0,0 +1,81 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+SESSION_TTL_DAYS = int(os.environ.get('SESSION_TTL_DAYS', '30'))
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', '10000'))
+SESSION_CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL', '5'))
+
+LOOKUP_SQL = '''
+SELECT player_id, EXTRACT(EPOCH FROM expires_at - NOW())
+FROM t_p64683754_best_game_analysis.sessions
+WHERE token_hash = %s AND revoked_at IS NULL AND expires_at > NOW()
+'''
+
+_cache: 'OrderedDict[str, Tuple[int, float]]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def bearer_token(event: Dict[str, Any]) -> Optional[str]:
+    headers = event.get('headers') or {}
+    for key, value in headers.items():
+        name = key.lower()
+        if name == 'x-auth-token' and value:
+            return value
+        if name == 'authorization' and value and value[:7].lower() == 'bearer ':
+            return value[7:].strip()
+    return None
+
+
+def cached_player(token_hash: str) -> Optional[int]:
+    with _cache_lock:
+        entry = _cache.get(token_hash)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del _cache[token_hash]
+            return None
+        _cache.move_to_end(token_hash)
+        return entry[0]
+
+
+def remember_player(token_hash: str, player_id: int, valid_for: float) -> None:
+    with _cache_lock:
+        _cache[token_hash] = (player_id, time.monotonic() + min(SESSION_CACHE_TTL, valid_for))
+        _cache.move_to_end(token_hash)
+        while len(_cache) > SESSION_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def forget_session(token: str) -> None:
+    with _cache_lock:
+        _cache.pop(hash_token(token), None)
+
+
+def resolve_player(cur: Any, event: Dict[str, Any]) -> Optional[int]:
+    '''
+    Business: Map the request's bearer token to a player id
+    Args: cur of a pooled connection (used only on cache miss), event with Authorization or X-Auth-Token header
+    Returns: player id, or None for a missing, expired or revoked token; revocation reaches other
+             function instances within SESSION_CACHE_TTL (logout clears only the local cache)
+    '''
+    token = bearer_token(event)
+    if not token:
+        return None
+    token_hash = hash_token(token)
+    player_id = cached_player(token_hash)
+    if player_id is not None:
+        return player_id
+    cur.execute(LOOKUP_SQL, (token_hash,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    remember_player(token_hash, row[0], float(row[1]))
+    return row[0]
@@ -0,0 +1,165 @@
+import json
+import os
+import hmac
+from typing import Dict, Any
+from db import get_pool
+
+REFRESH_MAX_AGE = int(os.environ.get('LEADERBOARD_REFRESH_SECONDS', '60'))
+OPERATOR_TOKEN = os.environ.get('OPERATOR_TOKEN', '')
+TOP_DEFAULT = 50
+TOP_MAX = 100
+AROUND_MAX = 25
+
+BOARDS = {
+    'level': ('level_rank', 'level'),
+    'coins': ('coins_rank', 'coins'),
+    'pvp': ('pvp_rank', 'pvp_wins'),
+    'weekly': ('weekly_rank', 'weekly_score')
+}
+
+
+def top_sql(board: str) -> str:
+    rank_column, value_column = BOARDS[board]
+    return f'''
+SELECT {rank_column}, player_id, username, avatar, level, {value_column}
+FROM t_p64683754_best_game_analysis.leaderboard_ranks
+WHERE {rank_column} <= %(limit)s
+ORDER BY {rank_column}
+'''
+
+
+def around_sql(board: str) -> str:
+    rank_column, value_column = BOARDS[board]
+    return f'''
+SELECT r.{rank_column}, r.player_id, r.username, r.avatar, r.level, r.{value_column}
+FROM t_p64683754_best_game_analysis.leaderboard_ranks me
+JOIN t_p64683754_best_game_analysis.leaderboard_ranks r
+  ON r.{rank_column} BETWEEN me.{rank_column} - %(around)s AND me.{rank_column} + %(around)s
+WHERE me.player_id = %(player_id)s
+ORDER BY r.{rank_column}
+'''
+
+
+def row_to_entry(row: Any) -> Dict[str, Any]:
+    return {
+        'rank': row[0],
+        'playerId': row[1],
+        'username': row[2],
+        'avatar': row[3],
+        'level': row[4],
+        'value': row[5]
+    }
+
+
+def is_operator(event: Dict[str, Any]) -> bool:
+    '''
+    Business: Check the X-Operator-Token header of scheduler calls against OPERATOR_TOKEN
+    Args: event with headers
+    Returns: True only when OPERATOR_TOKEN is configured and matches
+    '''
+    headers = event.get('headers') or {}
+    token = next((value for key, value in headers.items() if key.lower() == 'x-operator-token'), None)
+    return bool(OPERATOR_TOKEN) and isinstance(token, str) and hmac.compare_digest(token, OPERATOR_TOKEN)
+
+
+def refresh(event: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Business: Rebuild the ranking view; called by the scheduler, never by player reads
+    Args: event with X-Operator-Token header
+    Returns: HTTP response telling whether this call refreshed (false when another refresh holds the lock)
+    '''
+    if not is_operator(event):
+        return {
+            'statusCode': 403,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Доступ запрещен'})
+        }
+
+    pool = get_pool()
+    conn = pool.acquire()
+    cur = conn.cursor()
+
+    try:
+        cur.execute("SELECT t_p64683754_best_game_analysis.refresh_leaderboard_if_stale(0)")
+        refreshed = cur.fetchone()[0]
+        conn.commit()
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'refreshed': refreshed})
+        }
+
+    finally:
+        cur.close()
+        pool.release(conn)
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Leaderboards by level, coins, PvP wins and weekly score with rank lookup
+    Args: event with httpMethod, queryStringParameters (board, limit, playerId, around); POST with X-Operator-Token refreshes the view
+    Returns: HTTP response with top entries and optionally the player's neighborhood
+    '''
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Operator-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+
+    if method == 'POST':
+        return refresh(event)
+
+    params = event.get('queryStringParameters') or {}
+    board = params.get('board', 'level')
+    try:
+        limit = int(params.get('limit', TOP_DEFAULT))
+        around = int(params.get('around', 5))
+        player_id = int(params['playerId']) if params.get('playerId') else None
+    except ValueError:
+        limit = around = -1
+        player_id = None
+
+    if board not in BOARDS or not 0 <= limit <= TOP_MAX or not 0 <= around <= AROUND_MAX:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Неверные параметры рейтинга'})
+        }
+
+    pool = get_pool()
+    conn = pool.acquire()
+    cur = conn.cursor()
+
+    try:
+        result: Dict[str, Any] = {'board': board, 'entries': [], 'me': None, 'neighbors': []}
+        if limit:
+            cur.execute(top_sql(board), {'limit': limit})
+            result['entries'] = [row_to_entry(row) for row in cur.fetchall()]
+
+        if player_id is not None:
+            cur.execute(around_sql(board), {'player_id': player_id, 'around': around})
+            neighbors = [row_to_entry(row) for row in cur.fetchall()]
+            result['neighbors'] = neighbors
+            result['me'] = next((entry for entry in neighbors if entry['playerId'] == player_id), None)
+
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+                'Cache-Control': f'public, max-age={REFRESH_MAX_AGE}'
+            },
+            'body': json.dumps(result)
+        }
+
+    finally:
+        cur.close()
+        pool.release(conn)
@@ -0,0 +1,302 @@
+import json
+import os
+import hmac
+import random
+from typing import Dict, Any, Optional
+from db import get_pool
+from sessions import resolve_player
+
+POWER_BUCKET_SIZE = 25
+MATCH_BATCH_MAX = 1000
+DUEL_EXPERIENCE = 30
+DUEL_WEEKLY_SCORE = 50
+OPERATOR_TOKEN = os.environ.get('OPERATOR_TOKEN', '')
+INT4_MAX = 2 ** 31 - 1
+
+DUEL_SQL = f'''
+WITH locked AS (
+    SELECT p.id, p.coins, e.attack + e.defense AS power
+    FROM t_p64683754_best_game_analysis.players p
+    JOIN t_p64683754_best_game_analysis.player_effective_stats e ON e.player_id = p.id
+    WHERE p.id = %(player_id)s OR p.id = %(opponent_id)s OR p.username = %(opponent_username)s
+    ORDER BY p.id
+    FOR UPDATE OF p
+), duel AS (
+    SELECT me.id AS player_id, op.id AS opponent_id, me.power AS player_power, op.power AS opponent_power,
+           %(roll)s < COALESCE(me.power::float / NULLIF(me.power + op.power, 0), 0.5) AS won
+    FROM locked me, locked op
+    WHERE me.id = %(player_id)s AND op.id <> me.id
+      AND me.coins >= %(bet)s AND op.coins >= %(bet)s
+), settled AS (
+    UPDATE t_p64683754_best_game_analysis.players p
+    SET coins = p.coins + CASE WHEN (p.id = d.player_id) = d.won THEN %(bet)s ELSE -%(bet)s END,
+        pvp_wins = p.pvp_wins + CASE WHEN (p.id = d.player_id) = d.won THEN 1 ELSE 0 END,
+        pvp_losses = p.pvp_losses + CASE WHEN (p.id = d.player_id) = d.won THEN 0 ELSE 1 END,
+        experience = p.experience + CASE WHEN p.id = d.player_id THEN {DUEL_EXPERIENCE} ELSE 0 END
+    FROM duel d
+    WHERE p.id IN (d.player_id, d.opponent_id)
+    RETURNING p.id, p.coins, p.pvp_wins, p.pvp_losses
+), logged AS (
+    INSERT INTO t_p64683754_best_game_analysis.pvp_duels (player_id, opponent_id, winner_id, bet, player_power, opponent_power)
+    SELECT player_id, opponent_id, CASE WHEN won THEN player_id ELSE opponent_id END, %(bet)s, player_power, opponent_power
+    FROM duel
+    RETURNING id
+), weekly AS (
+    INSERT INTO t_p64683754_best_game_analysis.player_weekly_scores (week_start, player_id, score)
+    SELECT date_trunc('week', NOW())::date, CASE WHEN won THEN player_id ELSE opponent_id END, {DUEL_WEEKLY_SCORE}
+    FROM duel
+    ON CONFLICT (week_start, player_id) DO UPDATE SET score = player_weekly_scores.score + EXCLUDED.score
+)
+SELECT d.won, d.opponent_id, d.player_power, d.opponent_power,
+       (SELECT coins FROM locked WHERE id = %(player_id)s),
+       (SELECT coins FROM locked WHERE id <> %(player_id)s LIMIT 1),
+       (SELECT id FROM logged),
+       me.coins, me.pvp_wins, me.pvp_losses, op.coins
+FROM (SELECT 1) AS one
+LEFT JOIN duel d ON true
+LEFT JOIN settled me ON me.id = d.player_id
+LEFT JOIN settled op ON op.id = d.opponent_id
+'''
+
+QUEUE_SQL = '''
+INSERT INTO t_p64683754_best_game_analysis.pvp_queue (player_id, bet)
+SELECT id, %(bet)s FROM t_p64683754_best_game_analysis.players WHERE id = %(player_id)s AND coins >= %(bet)s
+ON CONFLICT (player_id) DO UPDATE SET bet = EXCLUDED.bet, queued_at = NOW()
+RETURNING player_id
+'''
+
+LEAVE_SQL = 'DELETE FROM t_p64683754_best_game_analysis.pvp_queue WHERE player_id = %(player_id)s'
+
+MATCH_SQL = f'''
+WITH queued AS (
+    SELECT player_id, bet, queued_at
+    FROM t_p64683754_best_game_analysis.pvp_queue
+    ORDER BY player_id
+    LIMIT %(batch)s
+    FOR UPDATE SKIP LOCKED
+), locked AS (
+    SELECT p.id, p.coins, e.attack + e.defense AS power
+    FROM t_p64683754_best_game_analysis.players p
+    JOIN t_p64683754_best_game_analysis.player_effective_stats e ON e.player_id = p.id
+    WHERE p.id IN (SELECT player_id FROM queued)
+    ORDER BY p.id
+    FOR UPDATE OF p
+), ranked AS (
+    SELECT q.player_id, q.bet, l.power, l.power / {POWER_BUCKET_SIZE} AS bucket,
+           ROW_NUMBER() OVER (PARTITION BY l.power / {POWER_BUCKET_SIZE} ORDER BY q.queued_at, q.player_id) AS pos
+    FROM queued q
+    JOIN locked l ON l.id = q.player_id
+    WHERE l.coins >= q.bet
+), duels AS (
+    SELECT a.player_id, b.player_id AS opponent_id, LEAST(a.bet, b.bet) AS bet,
+           a.power AS player_power, b.power AS opponent_power,
+           random() < COALESCE(a.power::float / NULLIF(a.power + b.power, 0), 0.5) AS won
+    FROM ranked a
+    JOIN ranked b ON b.bucket = a.bucket AND b.pos = a.pos + 1
+    WHERE a.pos %% 2 = 1
+), sides AS (
+    SELECT player_id AS id, won AS winner, bet FROM duels
+    UNION ALL
+    SELECT opponent_id, NOT won, bet FROM duels
+), settled AS (
+    UPDATE t_p64683754_best_game_analysis.players p
+    SET coins = p.coins + CASE WHEN s.winner THEN s.bet ELSE -s.bet END,
+        pvp_wins = p.pvp_wins + CASE WHEN s.winner THEN 1 ELSE 0 END,
+        pvp_losses = p.pvp_losses + CASE WHEN s.winner THEN 0 ELSE 1 END,
+        experience = p.experience + {DUEL_EXPERIENCE}
+    FROM sides s
+    WHERE p.id = s.id
+), logged AS (
+    INSERT INTO t_p64683754_best_game_analysis.pvp_duels (player_id, opponent_id, winner_id, bet, player_power, opponent_power)
+    SELECT player_id, opponent_id, CASE WHEN won THEN player_id ELSE opponent_id END, bet, player_power, opponent_power
+    FROM duels
+), weekly AS (
+    INSERT INTO t_p64683754_best_game_analysis.player_weekly_scores (week_start, player_id, score)
+    SELECT date_trunc('week', NOW())::date, id, {DUEL_WEEKLY_SCORE} FROM sides WHERE winner
+    ON CONFLICT (week_start, player_id) DO UPDATE SET score = player_weekly_scores.score + EXCLUDED.score
+), dequeued AS (
+    DELETE FROM t_p64683754_best_game_analysis.pvp_queue
+    WHERE player_id IN (SELECT id FROM sides)
+)
+SELECT player_id, opponent_id, CASE WHEN won THEN player_id ELSE opponent_id END, bet
+FROM duels
+ORDER BY player_id
+'''
+
+
+def parse_bet(value: Any) -> int:
+    if type(value) is not int or value < 1:
+        raise ValueError('bet')
+    return value
+
+
+def parse_opponent_id(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError('opponentId')
+    opponent_id = int(value)
+    if opponent_id < 1 or opponent_id > INT4_MAX:
+        raise ValueError('opponentId')
+    return opponent_id
+
+
+def is_operator(event: Dict[str, Any]) -> bool:
+    '''
+    Business: Check the X-Operator-Token header of scheduler calls against OPERATOR_TOKEN
+    Args: event with headers
+    Returns: True only when OPERATOR_TOKEN is configured and matches
+    '''
+    headers = event.get('headers') or {}
+    token = next((value for key, value in headers.items() if key.lower() == 'x-operator-token'), None)
+    return bool(OPERATOR_TOKEN) and isinstance(token, str) and hmac.compare_digest(token, OPERATOR_TOKEN)
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Server-authoritative PvP duels and batch matchmaking by power bucket
+    Args: event with httpMethod, bearer token header, body (action=duel with opponentId or opponentUsername, bet; action=queue/leave with bet; action=match with X-Operator-Token header, for the scheduler)
+    Returns: HTTP response with duel outcome, queue state or list of resolved matches
+    '''
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Auth-Token, X-Operator-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+
+    body_data = json.loads(event.get('body', '{}'))
+    action = body_data.get('action')
+
+    if action not in ('duel', 'queue', 'leave', 'match'):
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Unknown action'})
+        }
+
+    if action == 'match' and not is_operator(event):
+        return {
+            'statusCode': 403,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Доступ запрещен'})
+        }
+
+    try:
+        bet = parse_bet(body_data.get('bet')) if action in ('duel', 'queue') else 0
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Неверная сумма'})
+        }
+
+    try:
+        opponent_id = parse_opponent_id(body_data.get('opponentId')) if action == 'duel' else None
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Неверный противник'})
+        }
+
+    pool = get_pool()
+    conn = pool.acquire()
+    cur = conn.cursor()
+
+    try:
+        player_id = resolve_player(cur, event) if action != 'match' else None
+        if action != 'match' and player_id is None:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'})
+            }
+
+        if action == 'duel':
+            opponent_username = body_data.get('opponentUsername')
+            cur.execute(DUEL_SQL, {
+                'player_id': player_id,
+                'opponent_id': None if opponent_username else opponent_id,
+                'opponent_username': opponent_username,
+                'bet': bet,
+                'roll': random.random()
+            })
+            row = cur.fetchone()
+
+            if row[0] is None:
+                conn.rollback()
+                if row[4] is None or row[5] is None:
+                    error = 'Игрок не найден'
+                    status = 404
+                elif row[4] < bet:
+                    error = 'Недостаточно монет'
+                    status = 400
+                else:
+                    error = 'У противника недостаточно монет'
+                    status = 400
+                return {
+                    'statusCode': status,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': error})
+                }
+
+            conn.commit()
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({
+                    'duelId': row[6],
+                    'won': row[0],
+                    'opponentId': row[1],
+                    'playerPower': row[2],
+                    'opponentPower': row[3],
+                    'bet': bet,
+                    'coins': row[7],
+                    'pvpWins': row[8],
+                    'pvpLosses': row[9],
+                    'opponentCoins': row[10]
+                })
+            }
+
+        if action == 'queue':
+            cur.execute(QUEUE_SQL, {'player_id': player_id, 'bet': bet})
+            queued = cur.fetchone() is not None
+            conn.commit()
+            return {
+                'statusCode': 200 if queued else 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'queued': True, 'bet': bet} if queued else {'error': 'Недостаточно монет'})
+            }
+
+        if action == 'leave':
+            cur.execute(LEAVE_SQL, {'player_id': player_id})
+            conn.commit()
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'queued': False})
+            }
+
+        cur.execute(MATCH_SQL, {'batch': MATCH_BATCH_MAX})
+        matches = [
+            {'playerId': r[0], 'opponentId': r[1], 'winnerId': r[2], 'bet': r[3]}
+            for r in cur.fetchall()
+        ]
+        conn.commit()
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'matches': matches})
+        }
+
+    finally:
+        cur.close()
+        pool.release(conn)
@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+import functools
+import importlib
+import json
+import os
+import sys
+import uuid
+from typing import Dict, Any, Callable, List, Tuple
+from aiohttp import web
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+FUNCTION_MODULES = ('index', 'db', 'sessions', 'instrument', 'aiodb', 'aio', 'engine', 'seed')
+
+
+class Context:
+    def __init__(self, function_name: str):
+        self.request_id = uuid.uuid4().hex
+        self.function_name = function_name
+
+
+def load_function(name: str, prefer_async: bool) -> Tuple[Callable, Any]:
+    '''
+    Business: Import one cloud function in isolation from the others (they share module names)
+    Args: name of the directory under backend/, prefer_async to use aio.handler when the function has one
+    Returns: handler and the function's aiodb module (None for sync handlers)
+    '''
+    path = os.path.join(BACKEND_DIR, name)
+    saved = {module: sys.modules.pop(module) for module in FUNCTION_MODULES if module in sys.modules}
+    sys.path.insert(0, path)
+    try:
+        if prefer_async and os.path.exists(os.path.join(path, 'aio.py')):
+            return importlib.import_module('aio').handler, sys.modules['aiodb']
+        return importlib.import_module('index').handler, None
+    finally:
+        sys.path.remove(path)
+        for module in FUNCTION_MODULES:
+            sys.modules.pop(module, None)
+        sys.modules.update(saved)
+
+
+async def to_event(request: web.Request) -> Dict[str, Any]:
+    body = await request.text()
+    return {
+        'httpMethod': request.method,
+        'path': '/' + request.match_info.get('tail', ''),
+        'headers': dict(request.headers),
+        'queryStringParameters': dict(request.query) or None,
+        'body': body,
+        'isBase64Encoded': False
+    }
+
+
+def endpoint(name: str, handler: Callable) -> Callable:
+    is_async = asyncio.iscoroutinefunction(handler)
+
+    async def handle(request: web.Request) -> web.Response:
+        event = await to_event(request)
+        context = Context(name)
+        if is_async:
+            response = await handler(event, context)
+        else:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(None, functools.partial(handler, event, context))
+        return web.Response(
+            status=response['statusCode'],
+            headers={key: str(value) for key, value in (response.get('headers') or {}).items()},
+            body=response.get('body') or ''
+        )
+
+    return handle
+
+
+def build_app(names: List[str], prefer_async: bool) -> web.Application:
+    '''
+    Business: Mount each function at /<name> the way func2url.json names them
+    Args: names of functions, prefer_async to serve aio handlers where available
+    Returns: aiohttp application; sync handlers run in the default thread pool
+    '''
+    app = web.Application()
+    pools = []
+    for name in names:
+        handler, aiodb = load_function(name, prefer_async)
+        if aiodb is not None:
+            pools.append(aiodb)
+        route = endpoint(name, handler)
+        app.router.add_route('*', f'/{name}', route)
+        app.router.add_route('*', f'/{name}/{{tail:.*}}', route)
+        print(f'mounted /{name} ({"async" if asyncio.iscoroutinefunction(handler) else "sync"})', file=sys.stderr)
+
+    async def close_pools(app: web.Application) -> None:
+        for aiodb in pools:
+            await aiodb.close_pool()
+
+    app.on_cleanup.append(close_pools)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Serve the cloud functions from func2url.json on one local event loop')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--sync', action='store_true', help='serve index.handler in threads even where aio.handler exists')
+    args = parser.parse_args()
+
+    with open(os.path.join(BACKEND_DIR, 'func2url.json'), encoding='utf-8') as func2url:
+        names = sorted(json.load(func2url))
+    web.run_app(build_app(names, not args.sync), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
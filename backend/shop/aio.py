@@ -0,0 +1,216 @@
+import json
+from typing import Dict, Any, Optional
+from aiodb import get_pool, fetchrow, fetch
+from sessions import LOOKUP_SQL, hash_token, bearer_token, cached_player, remember_player
+from instrument import instrumented, phase, annotate
+from index import (
+    PURCHASE_SQL, BATCH_PURCHASE_SQL, EQUIP_SQL, PURCHASE_RECEIPT_SQL, CATALOG_VERSION_SQL, CATALOG_SQL, CATALOG_QUERY_KEYS,
+    get_header, parse_catalog_query, catalog_page_sql, catalog_page, catalog_is_fresh, catalog_is_stale,
+    store_catalog, touch_catalog, catalog_response, item_to_dict, parse_id, parse_cart, purchase_outcome, replay_response
+)
+
+async def resolve_player(conn: Any, event: Dict[str, Any]) -> Optional[int]:
+    '''
+    Business: Async counterpart of sessions.resolve_player sharing the same per-process cache
+    Args: conn of the asyncpg pool (used only on cache miss), event with Authorization or X-Auth-Token header
+    Returns: player id, or None for a missing, expired or revoked token
+    '''
+    token = bearer_token(event)
+    if not token:
+        return None
+    token_hash = hash_token(token)
+    player_id = cached_player(token_hash)
+    if player_id is not None:
+        return player_id
+    row = await fetchrow(conn, LOOKUP_SQL, (token_hash,))
+    if not row:
+        return None
+    remember_player(token_hash, row[0], float(row[1]))
+    return row[0]
+
+async def settle_purchase(conn: Any, sql: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Business: Run a purchase statement in its own transaction and turn its outcome into a response
+    Args: conn of the asyncpg pool, sql returning balances/player/price/prior/receipt columns, params with idempotency_key
+    Returns: HTTP response; commits only a fresh successful purchase
+    '''
+    transaction = conn.transaction()
+    await transaction.start()
+    try:
+        commit, response = purchase_outcome(await fetchrow(conn, sql, params), params)
+    except BaseException:
+        await transaction.rollback()
+        raise
+
+    if commit:
+        await transaction.commit()
+        return response
+
+    await transaction.rollback()
+
+    if response is None:
+        return replay_response(await fetchrow(conn, PURCHASE_RECEIPT_SQL, params), params)
+
+    return response
+
+@instrumented('shop')
+async def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Async variant of the shop handler on a shared asyncpg pool, for long-lived hosts
+    Args: same event as index.handler (catalog query parameters, bearer token header, purchase/equip body)
+    Returns: HTTP response identical to index.handler
+    '''
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, Idempotency-Key, Authorization, X-Auth-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+
+    params = event.get('queryStringParameters') or {}
+    catalog_query = None
+    if method == 'GET' and any(key in params for key in CATALOG_QUERY_KEYS):
+        try:
+            catalog_query = parse_catalog_query(params)
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Неверные параметры фильтра'})
+            }
+
+    if method == 'GET' and catalog_query is None and catalog_is_fresh():
+        annotate(catalog='cached')
+        return catalog_response(event)
+
+    pool = await get_pool()
+    with phase('connect'):
+        conn = await pool.acquire()
+
+    try:
+        if method == 'GET' and catalog_query is not None:
+            annotate(catalog='page')
+            sql, args = catalog_page_sql(catalog_query)
+            page = catalog_page(await fetch(conn, sql, args), catalog_query)
+            with phase('encode'):
+                body = json.dumps(page)
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': body
+            }
+
+        elif method == 'GET':
+            db_version = (await fetchrow(conn, CATALOG_VERSION_SQL))[0]
+
+            if catalog_is_stale(db_version):
+                annotate(catalog='rebuilt')
+                rows = await fetch(conn, CATALOG_SQL)
+                with phase('encode'):
+                    body = json.dumps({'items': [item_to_dict(item) for item in rows]})
+
+                store_catalog(db_version, body)
+            else:
+                annotate(catalog='revalidated')
+                touch_catalog()
+
+            return catalog_response(event)
+
+        elif method == 'POST':
+            with phase('decode'):
+                body_data = json.loads(event.get('body', '{}'))
+            annotate(action=body_data.get('action', 'buy'))
+            with phase('session'):
+                player_id = await resolve_player(conn, event)
+
+            if player_id is None:
+                return {
+                    'statusCode': 401,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Требуется авторизация'})
+                }
+
+            idempotency_key = body_data.get('idempotencyKey') or get_header(event, 'Idempotency-Key')
+
+            if idempotency_key is not None and (not isinstance(idempotency_key, str) or len(idempotency_key) > 64):
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Неверный ключ запроса'})
+                }
+
+            try:
+                item_id = parse_id(body_data.get('itemId'))
+                inventory_id = parse_id(body_data.get('inventoryId'))
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Неверный идентификатор предмета'})
+                }
+
+            if body_data.get('action') in ('equip', 'unequip'):
+                equipped = body_data['action'] == 'equip'
+                async with conn.transaction():
+                    row = await fetchrow(conn, EQUIP_SQL, {
+                        'player_id': player_id,
+                        'inventory_id': inventory_id,
+                        'equipped': equipped,
+                        'sign': 1 if equipped else -1
+                    })
+                stats = row[0:3] if row[0] is not None else row[3:6]
+
+                if row[6] is None or stats[0] is None:
+                    return {
+                        'statusCode': 404,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Предмет не найден'})
+                    }
+
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({
+                        'success': True,
+                        'equipped': equipped,
+                        'attack': stats[0],
+                        'defense': stats[1],
+                        'maxHealth': stats[2]
+                    })
+                }
+
+            if body_data.get('action') == 'buy_batch':
+                cart = parse_cart(body_data.get('items'))
+                if cart is None:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Неверная корзина'})
+                    }
+                params = {
+                    'player_id': player_id,
+                    'item_ids': list(cart.keys()),
+                    'quantities': list(cart.values()),
+                    'item_count': len(cart),
+                    'idempotency_key': idempotency_key
+                }
+                return await settle_purchase(conn, BATCH_PURCHASE_SQL, params)
+
+            params = {'player_id': player_id, 'item_id': item_id, 'idempotency_key': idempotency_key}
+            return await settle_purchase(conn, PURCHASE_SQL, params)
+
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'})
+        }
+
+    finally:
+        await pool.release(conn)
@@ -0,0 +1,131 @@
+import os
+import re
+import time
+import asyncio
+import functools
+from typing import Any, List, Optional, Tuple
+import asyncpg
+from instrument import LOG_ENABLED, tracing, record_execute, record_commit, record_rollback
+
+ASYNC_POOL_MIN_SIZE = int(os.environ.get('ASYNC_POOL_MIN_SIZE', '1'))
+ASYNC_POOL_MAX_SIZE = int(os.environ.get('ASYNC_POOL_MAX_SIZE', '20'))
+ASYNC_POOL_COMMAND_TIMEOUT = float(os.environ.get('ASYNC_POOL_COMMAND_TIMEOUT', '10'))
+
+_PLACEHOLDER = re.compile(r'%\((\w+)\)s|%s|%%')
+
+_pool: Optional[asyncpg.Pool] = None
+_pool_loop: Optional[asyncio.AbstractEventLoop] = None
+_pool_lock: Optional[asyncio.Lock] = None
+
+
+@functools.lru_cache(maxsize=256)
+def convert(sql: str) -> Tuple[str, Tuple[str, ...]]:
+    '''
+    Business: Rewrite a psycopg2 statement (%s or %(name)s placeholders) into asyncpg $n form
+    Args: sql shared with the sync handler
+    Returns: converted SQL and the parameter names in $n order (empty for positional statements)
+    '''
+    names: List[str] = []
+    positional = 0
+
+    def replace(match: Any) -> str:
+        nonlocal positional
+        if match.group(0) == '%%':
+            return '%'
+        name = match.group(1)
+        if name is None:
+            positional += 1
+            return f'${positional}'
+        if name not in names:
+            names.append(name)
+        return f'${names.index(name) + 1}'
+
+    converted = _PLACEHOLDER.sub(replace, sql)
+    if positional and names:
+        raise ValueError('mixed positional and named placeholders')
+    return converted, tuple(names)
+
+
+def bind(sql: str, params: Any = ()) -> List[Any]:
+    converted, names = convert(sql)
+    if names:
+        return [converted] + [params[name] for name in names]
+    return [converted] + list(params)
+
+
+class TracedConnection(asyncpg.Connection):
+    '''
+    Business: asyncpg connection reporting statements, commits and rollbacks to the active trace
+    Args: same as asyncpg.connect
+    Returns: connection usable anywhere a plain one is
+    '''
+
+    async def _traced(self, method: Any, query: str, *args: Any, **kwargs: Any) -> Any:
+        if not tracing():
+            return await method(query, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return await method(query, *args, **kwargs)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if query.startswith('COMMIT'):
+                record_commit(elapsed_ms)
+            elif query.startswith('ROLLBACK'):
+                record_rollback()
+            else:
+                record_execute(query, elapsed_ms)
+
+    async def execute(self, query: str, *args: Any, **kwargs: Any) -> Any:
+        return await self._traced(super().execute, query, *args, **kwargs)
+
+    async def fetch(self, query: str, *args: Any, **kwargs: Any) -> Any:
+        return await self._traced(super().fetch, query, *args, **kwargs)
+
+    async def fetchrow(self, query: str, *args: Any, **kwargs: Any) -> Any:
+        return await self._traced(super().fetchrow, query, *args, **kwargs)
+
+
+async def get_pool() -> asyncpg.Pool:
+    '''
+    Business: Lazily create the asyncpg pool shared by every request on the running event loop
+    Args: none; DATABASE_URL and ASYNC_POOL_* environment variables
+    Returns: asyncpg pool (recreated if the loop changed, e.g. between asyncio.run calls)
+    '''
+    global _pool, _pool_loop, _pool_lock
+    loop = asyncio.get_running_loop()
+    if _pool is not None and _pool_loop is loop:
+        return _pool
+    if _pool_lock is None or _pool_loop is not loop:
+        _pool_lock = asyncio.Lock()
+        _pool_loop = loop
+        _pool = None
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await asyncpg.create_pool(
+                os.environ.get('DATABASE_URL'),
+                min_size=ASYNC_POOL_MIN_SIZE,
+                max_size=ASYNC_POOL_MAX_SIZE,
+                command_timeout=ASYNC_POOL_COMMAND_TIMEOUT,
+                connection_class=TracedConnection if LOG_ENABLED else asyncpg.Connection
+            )
+    return _pool
+
+
+async def close_pool() -> None:
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+
+
+async def fetchrow(conn: Any, sql: str, params: Any = ()) -> Optional[Tuple]:
+    row = await conn.fetchrow(*bind(sql, params))
+    return tuple(row) if row is not None else None
+
+
+async def fetch(conn: Any, sql: str, params: Any = ()) -> List[Tuple]:
+    return [tuple(row) for row in await conn.fetch(*bind(sql, params))]
+
+
+async def execute(conn: Any, sql: str, params: Any = ()) -> str:
+    return await conn.execute(*bind(sql, params))
@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional
+import psycopg2
+import psycopg2.extensions
+
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+POOL_ACQUIRE_TIMEOUT = float(os.environ.get('DB_POOL_ACQUIRE_TIMEOUT', '5'))
+POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', '30'))
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class ConnectionPool:
+    '''
+    Business: Postgres connections kept warm between invocations of the function
+    Args: dsn of the database, max_size of connections opened by this process, optional psycopg2 connection_factory
+    Returns: pool with acquire/release and usage counters
+    '''
+
+    def __init__(self, dsn: str, max_size: int = POOL_MAX_SIZE, connection_factory: Any = None):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.connection_factory = connection_factory
+        self._idle: List[Any] = []
+        self._last_used: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._counters: Dict[str, Any] = {
+            'acquired': 0,
+            'reused': 0,
+            'connected': 0,
+            'discarded': 0,
+            'health_checks': 0,
+            'acquire_ms_total': 0.0,
+            'acquire_ms_max': 0.0
+        }
+
+    def _connect(self) -> Any:
+        conn = psycopg2.connect(self.dsn, connection_factory=self.connection_factory)
+        with self._lock:
+            self._counters['connected'] += 1
+        return conn
+
+    def _is_healthy(self, conn: Any) -> bool:
+        if conn.closed:
+            return False
+        idle_for = time.monotonic() - self._last_used.get(id(conn), 0.0)
+        if idle_for < POOL_HEALTH_CHECK_INTERVAL:
+            return True
+        with self._lock:
+            self._counters['health_checks'] += 1
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn: Any) -> None:
+        self._last_used.pop(id(conn), None)
+        with self._lock:
+            self._counters['discarded'] += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def acquire(self) -> Any:
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=POOL_ACQUIRE_TIMEOUT):
+            raise PoolExhausted('No free database connection in %.1fs' % POOL_ACQUIRE_TIMEOUT)
+        try:
+            conn = None
+            reused = False
+            while conn is None:
+                with self._lock:
+                    candidate = self._idle.pop() if self._idle else None
+                if candidate is None:
+                    conn = self._connect()
+                elif self._is_healthy(candidate):
+                    conn = candidate
+                    reused = True
+                else:
+                    self._discard(candidate)
+        except Exception:
+            self._slots.release()
+            raise
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            self._counters['acquired'] += 1
+            if reused:
+                self._counters['reused'] += 1
+            self._counters['acquire_ms_total'] += elapsed_ms
+            self._counters['acquire_ms_max'] = max(self._counters['acquire_ms_max'], elapsed_ms)
+        return conn
+
+    def release(self, conn: Any) -> None:
+        try:
+            if not conn.closed:
+                status = conn.get_transaction_status()
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    conn.close()
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+        except psycopg2.Error:
+            pass
+        try:
+            if conn.closed:
+                self._discard(conn)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+                with self._lock:
+                    self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            result = dict(self._counters)
+            result['idle'] = len(self._idle)
+        acquired = result['acquired']
+        result['max_size'] = self.max_size
+        result['acquire_ms_avg'] = result['acquire_ms_total'] / acquired if acquired else 0.0
+        result['reuse_ratio'] = result['reused'] / acquired if acquired else 0.0
+        return result
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(connection_factory: Any = None) -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(os.environ.get('DATABASE_URL'), connection_factory=connection_factory)
+    return _pool
+
+
+def pool_stats() -> Dict[str, Any]:
+    return get_pool().stats()
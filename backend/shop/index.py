@@ -1,7 +1,12 @@
 import json
 import os
-from typing import Dict, Any
-import psycopg2
+import time
+import base64
+import hashlib
+from typing import Dict, Any, Optional, List, Tuple
+from db import get_pool
+from sessions import resolve_player
+from instrument import instrumented, phase, annotate, connection_factory
 
 ITEMS_DATA = [
     {'name': 'Деревянный меч', 'icon': '🗡️', 'category': 'weapon', 'rarity': 'common', 'price_coins': 50, 'attack_bonus': 5, 'description': 'Простое оружие для новичков'},
@@ -127,10 +132,496 @@ ITEMS_DATA = [
     {'name': 'Скин: Демон', 'icon': '😈', 'category': 'skin', 'rarity': 'legendary', 'price_gems': 280, 'tradeable': False, 'description': 'Адский облик'},
 ]
 
+CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', '60'))
+ITEMS_DATA_HASH = hashlib.sha256(json.dumps(ITEMS_DATA, sort_keys=True).encode()).hexdigest()[:16]
+
+ITEM_COLUMNS = 'id, name, icon, description, category, rarity, price_coins, price_gems, attack_bonus, defense_bonus, health_bonus'
+CATALOG_PAGE_DEFAULT = 20
+CATALOG_PAGE_MAX = 100
+CATALOG_SORTS = {
+    'rarity': ['rarity', 'price_coins', 'price_gems', 'id'],
+    'price_coins': ['price_coins', 'id'],
+    'price_gems': ['price_gems', 'id']
+}
+CART_MAX_LINES = 50
+CART_MAX_QUANTITY = 99
+INT4_MAX = 2 ** 31 - 1
+CATALOG_STAT_FILTERS = {'minAttack': 'attack_bonus', 'minDefense': 'defense_bonus', 'minHealth': 'health_bonus'}
+CATALOG_QUERY_KEYS = ('category', 'rarity', 'currency', 'minPrice', 'maxPrice', 'sort', 'limit', 'cursor', *CATALOG_STAT_FILTERS)
+CATALOG_VERSION_SQL = 'SELECT version FROM t_p64683754_best_game_analysis.catalog_version WHERE id = 1'
+CATALOG_SQL = f"SELECT {ITEM_COLUMNS} FROM t_p64683754_best_game_analysis.items ORDER BY {', '.join(CATALOG_SORTS['rarity'])}"
+
+_catalog_cache: Dict[str, Any] = {'db_version': None, 'etag': None, 'body': None, 'checked_at': 0.0}
+
+def get_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    headers = event.get('headers') or {}
+    for key, value in headers.items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def catalog_is_fresh() -> bool:
+    return _catalog_cache['body'] is not None and time.monotonic() - _catalog_cache['checked_at'] < CATALOG_CACHE_TTL
+
+def store_catalog(db_version: int, body: str) -> None:
+    global _catalog_cache
+    _catalog_cache = {
+        'db_version': db_version,
+        'etag': f'"{ITEMS_DATA_HASH}-{db_version}"',
+        'body': body,
+        'checked_at': time.monotonic()
+    }
+
+def catalog_is_stale(db_version: int) -> bool:
+    return _catalog_cache['body'] is None or _catalog_cache['db_version'] != db_version
+
+def touch_catalog() -> None:
+    _catalog_cache['checked_at'] = time.monotonic()
+
+def catalog_response(event: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Business: Serve the cached catalog body, or 304 when the client already has it
+    Args: event with optional If-None-Match header
+    Returns: HTTP response with pre-serialized items or empty 304
+    '''
+    cache = _catalog_cache
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+        'Cache-Control': f'public, max-age={CATALOG_CACHE_TTL}',
+        'ETag': cache['etag']
+    }
+    if_none_match = get_header(event, 'If-None-Match')
+    if if_none_match:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        if cache['etag'] in tags or '*' in tags:
+            return {'statusCode': 304, 'headers': headers, 'body': ''}
+    return {'statusCode': 200, 'headers': headers, 'body': cache['body']}
+
+PURCHASE_SQL = '''
+WITH item AS (
+    SELECT id, price_coins, price_gems, attack_bonus, defense_bonus, health_bonus, stackable
+    FROM t_p64683754_best_game_analysis.items WHERE id = %(item_id)s
+), prior AS (
+    SELECT coins, gems, attack, defense, max_health, item_id
+    FROM t_p64683754_best_game_analysis.purchases
+    WHERE player_id = %(player_id)s AND idempotency_key = %(idempotency_key)s
+), debit AS (
+    UPDATE t_p64683754_best_game_analysis.players p
+    SET coins = p.coins - item.price_coins,
+        gems = p.gems - item.price_gems
+    FROM item, t_p64683754_best_game_analysis.player_effective_stats e
+    WHERE p.id = %(player_id)s
+      AND e.player_id = p.id
+      AND p.coins >= item.price_coins
+      AND p.gems >= item.price_gems
+      AND NOT EXISTS (SELECT 1 FROM prior)
+    RETURNING p.id AS player_id, item.id AS item_id, item.stackable, p.coins, p.gems, e.attack, e.defense, e.max_health,
+              item.attack_bonus, item.defense_bonus, item.health_bonus
+), granted AS (
+    INSERT INTO t_p64683754_best_game_analysis.inventory (player_id, item_id, quantity, stackable, equipped)
+    SELECT player_id, item_id, 1, stackable, NOT stackable FROM debit
+    ON CONFLICT (player_id, item_id) WHERE stackable
+    DO UPDATE SET quantity = inventory.quantity + EXCLUDED.quantity
+), applied AS (
+    UPDATE t_p64683754_best_game_analysis.player_effective_stats e
+    SET attack = e.attack + d.attack_bonus,
+        defense = e.defense + d.defense_bonus,
+        max_health = e.max_health + d.health_bonus,
+        updated_at = NOW()
+    FROM debit d
+    WHERE e.player_id = d.player_id AND NOT d.stackable
+    RETURNING e.attack, e.defense, e.max_health
+), receipt AS (
+    INSERT INTO t_p64683754_best_game_analysis.purchases (player_id, item_id, idempotency_key, coins, gems, attack, defense, max_health)
+    SELECT d.player_id, d.item_id, %(idempotency_key)s, d.coins, d.gems,
+           COALESCE(a.attack, d.attack), COALESCE(a.defense, d.defense), COALESCE(a.max_health, d.max_health)
+    FROM debit d LEFT JOIN applied a ON true
+    WHERE %(idempotency_key)s IS NOT NULL
+    ON CONFLICT (player_id, idempotency_key) DO NOTHING
+    RETURNING id
+)
+SELECT d.coins, d.gems, COALESCE(a.attack, d.attack), COALESCE(a.defense, d.defense), COALESCE(a.max_health, d.max_health),
+       p.coins, p.gems, i.price_coins, i.price_gems,
+       pr.coins, pr.gems, pr.attack, pr.defense, pr.max_health, pr.item_id,
+       (SELECT id FROM receipt)
+FROM (SELECT 1) AS one
+LEFT JOIN debit d ON true
+LEFT JOIN applied a ON true
+LEFT JOIN t_p64683754_best_game_analysis.players p ON p.id = %(player_id)s
+LEFT JOIN item i ON true
+LEFT JOIN prior pr ON true
+'''
+
+BATCH_PURCHASE_SQL = '''
+WITH cart AS (
+    SELECT c.item_id, c.quantity, i.stackable,
+           i.price_coins * c.quantity AS coins,
+           i.price_gems * c.quantity AS gems,
+           CASE WHEN i.stackable THEN 0 ELSE i.attack_bonus * c.quantity END AS attack,
+           CASE WHEN i.stackable THEN 0 ELSE i.defense_bonus * c.quantity END AS defense,
+           CASE WHEN i.stackable THEN 0 ELSE i.health_bonus * c.quantity END AS health
+    FROM unnest(%(item_ids)s::int[], %(quantities)s::int[]) AS c(item_id, quantity)
+    JOIN t_p64683754_best_game_analysis.items i ON i.id = c.item_id
+), totals AS (
+    SELECT COUNT(*) AS found,
+           COALESCE(SUM(coins), 0) AS coins, COALESCE(SUM(gems), 0) AS gems,
+           COALESCE(SUM(attack), 0) AS attack, COALESCE(SUM(defense), 0) AS defense,
+           COALESCE(SUM(health), 0) AS health
+    FROM cart
+), prior AS (
+    SELECT coins, gems, attack, defense, max_health, item_id
+    FROM t_p64683754_best_game_analysis.purchases
+    WHERE player_id = %(player_id)s AND idempotency_key = %(idempotency_key)s
+), debit AS (
+    UPDATE t_p64683754_best_game_analysis.players p
+    SET coins = p.coins - t.coins,
+        gems = p.gems - t.gems
+    FROM totals t, t_p64683754_best_game_analysis.player_effective_stats e
+    WHERE p.id = %(player_id)s
+      AND e.player_id = p.id
+      AND t.found = %(item_count)s
+      AND p.coins >= t.coins
+      AND p.gems >= t.gems
+      AND NOT EXISTS (SELECT 1 FROM prior)
+    RETURNING p.id AS player_id, p.coins, p.gems, e.attack, e.defense, e.max_health
+), granted AS (
+    INSERT INTO t_p64683754_best_game_analysis.inventory (player_id, item_id, quantity, stackable, equipped)
+    SELECT d.player_id, c.item_id, CASE WHEN c.stackable THEN c.quantity ELSE 1 END, c.stackable, NOT c.stackable
+    FROM debit d
+    CROSS JOIN cart c
+    CROSS JOIN LATERAL generate_series(1, CASE WHEN c.stackable THEN 1 ELSE c.quantity END)
+    ON CONFLICT (player_id, item_id) WHERE stackable
+    DO UPDATE SET quantity = inventory.quantity + EXCLUDED.quantity
+), applied AS (
+    UPDATE t_p64683754_best_game_analysis.player_effective_stats e
+    SET attack = e.attack + t.attack,
+        defense = e.defense + t.defense,
+        max_health = e.max_health + t.health,
+        updated_at = NOW()
+    FROM debit d, totals t
+    WHERE e.player_id = d.player_id AND (t.attack, t.defense, t.health) <> (0, 0, 0)
+    RETURNING e.attack, e.defense, e.max_health
+), receipt AS (
+    INSERT INTO t_p64683754_best_game_analysis.purchases (player_id, item_id, idempotency_key, coins, gems, attack, defense, max_health)
+    SELECT d.player_id, NULL, %(idempotency_key)s, d.coins, d.gems,
+           COALESCE(a.attack, d.attack), COALESCE(a.defense, d.defense), COALESCE(a.max_health, d.max_health)
+    FROM debit d LEFT JOIN applied a ON true
+    WHERE %(idempotency_key)s IS NOT NULL
+    ON CONFLICT (player_id, idempotency_key) DO NOTHING
+    RETURNING id
+)
+SELECT d.coins, d.gems, COALESCE(a.attack, d.attack), COALESCE(a.defense, d.defense), COALESCE(a.max_health, d.max_health),
+       p.coins, p.gems,
+       CASE WHEN t.found = %(item_count)s THEN t.coins END, t.gems,
+       pr.coins, pr.gems, pr.attack, pr.defense, pr.max_health, pr.item_id,
+       (SELECT id FROM receipt)
+FROM totals t
+LEFT JOIN debit d ON true
+LEFT JOIN applied a ON true
+LEFT JOIN t_p64683754_best_game_analysis.players p ON p.id = %(player_id)s
+LEFT JOIN prior pr ON true
+'''
+
+EQUIP_SQL = '''
+WITH toggled AS (
+    UPDATE t_p64683754_best_game_analysis.inventory inv
+    SET equipped = %(equipped)s
+    FROM t_p64683754_best_game_analysis.items i
+    WHERE inv.id = %(inventory_id)s
+      AND inv.player_id = %(player_id)s
+      AND inv.equipped <> %(equipped)s
+      AND i.id = inv.item_id
+    RETURNING inv.player_id, i.attack_bonus, i.defense_bonus, i.health_bonus
+), applied AS (
+    UPDATE t_p64683754_best_game_analysis.player_effective_stats e
+    SET attack = e.attack + %(sign)s * t.attack_bonus,
+        defense = e.defense + %(sign)s * t.defense_bonus,
+        max_health = e.max_health + %(sign)s * t.health_bonus,
+        updated_at = NOW()
+    FROM toggled t
+    WHERE e.player_id = t.player_id
+    RETURNING e.attack, e.defense, e.max_health
+)
+SELECT a.attack, a.defense, a.max_health,
+       e.attack, e.defense, e.max_health,
+       inv.id
+FROM (SELECT 1) AS one
+LEFT JOIN applied a ON true
+LEFT JOIN t_p64683754_best_game_analysis.player_effective_stats e ON e.player_id = %(player_id)s
+LEFT JOIN t_p64683754_best_game_analysis.inventory inv ON inv.id = %(inventory_id)s AND inv.player_id = %(player_id)s
+'''
+
+PURCHASE_RECEIPT_SQL = '''
+SELECT coins, gems, attack, defense, max_health, item_id
+FROM t_p64683754_best_game_analysis.purchases
+WHERE player_id = %(player_id)s AND idempotency_key = %(idempotency_key)s
+'''
+
+def purchase_response(balances: Tuple, replayed: bool) -> Dict[str, Any]:
+    annotate(replayed=replayed)
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({
+            'success': True,
+            'replayed': replayed,
+            'coins': balances[0],
+            'gems': balances[1],
+            'attack': balances[2],
+            'defense': balances[3],
+            'maxHealth': balances[4]
+        })
+    }
+
+def to_int4(value: Any) -> int:
+    '''
+    Business: Coerce a request number (JSON int or digit string) to a value psycopg2 and asyncpg bind alike
+    Args: value from a query string or request body
+    Returns: int within the int4 range; raises ValueError otherwise
+    '''
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError('int4')
+    number = int(value)
+    if number < -INT4_MAX - 1 or number > INT4_MAX:
+        raise ValueError('int4')
+    return number
+
+def parse_id(value: Any) -> Optional[int]:
+    return None if value is None else to_int4(value)
+
+def parse_cart(items: Any) -> Optional[Dict[int, int]]:
+    if not isinstance(items, list) or not items or len(items) > CART_MAX_LINES:
+        return None
+    cart: Dict[int, int] = {}
+    for line in items:
+        if not isinstance(line, dict):
+            return None
+        try:
+            item_id = to_int4(line.get('itemId'))
+        except ValueError:
+            return None
+        quantity = line.get('quantity', 1)
+        if type(quantity) is not int or quantity < 1 or quantity > CART_MAX_QUANTITY:
+            return None
+        cart[item_id] = cart.get(item_id, 0) + quantity
+    if any(quantity > CART_MAX_QUANTITY for quantity in cart.values()):
+        return None
+    return cart
+
+def replay_response(receipt: Tuple, params: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Business: Replay a stored receipt, refusing keys reused for a different purchase
+    Args: receipt with balances and item_id (NULL for batches), params of the current request
+    Returns: replayed purchase response, or 409 when the receipt belongs to another item or a cart
+    '''
+    if receipt[5] != params.get('item_id'):
+        return {
+            'statusCode': 409,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Ключ запроса уже использован для другой покупки'})
+        }
+    return purchase_response(receipt, True)
+
+def purchase_outcome(row: Tuple, params: Dict[str, Any]) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    '''
+    Business: Decide what a purchase statement result means
+    Args: row with balances/player/price/prior/receipt columns, params with idempotency_key
+    Returns: (commit, response); response is None when a concurrent duplicate won and its receipt must be re-read
+    '''
+    balances, player, price, prior, receipt_id = row[0:5], row[5:7], row[7:9], row[9:15], row[15]
+    
+    if balances[0] is not None and (params['idempotency_key'] is None or receipt_id is not None):
+        return True, purchase_response(balances, False)
+    
+    if prior[0] is not None:
+        return False, replay_response(prior, params)
+    
+    if balances[0] is not None:
+        return False, None
+    
+    if player[0] is None:
+        return False, {
+            'statusCode': 404,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Игрок не найден'})
+        }
+    
+    if price[0] is None:
+        return False, {
+            'statusCode': 404,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Предмет не найден'})
+        }
+    
+    if player[1] < price[1]:
+        return False, {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Недостаточно кристаллов'})
+        }
+    
+    return False, {
+        'statusCode': 400,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': 'Недостаточно монет'})
+    }
+
+def settle_purchase(conn: Any, cur: Any, sql: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Business: Run a purchase statement and turn its outcome into a response
+    Args: conn, cur, sql returning balances/player/price/prior/receipt columns, params with idempotency_key
+    Returns: HTTP response; commits only a fresh successful purchase
+    '''
+    cur.execute(sql, params)
+    commit, response = purchase_outcome(cur.fetchone(), params)
+    
+    if commit:
+        conn.commit()
+        return response
+    
+    conn.rollback()
+    
+    if response is None:
+        cur.execute(PURCHASE_RECEIPT_SQL, params)
+        return replay_response(cur.fetchone(), params)
+    
+    return response
+
+def item_to_dict(item: Tuple) -> Dict[str, Any]:
+    return {
+        'id': item[0],
+        'name': item[1],
+        'icon': item[2],
+        'description': item[3],
+        'category': item[4],
+        'rarity': item[5],
+        'priceCoins': item[6],
+        'priceGems': item[7],
+        'attackBonus': item[8],
+        'defenseBonus': item[9],
+        'healthBonus': item[10]
+    }
+
+def encode_cursor(sort: str, values: List[Any]) -> str:
+    raw = json.dumps([sort] + list(values), ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str, sort: str) -> List[Any]:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('cursor')
+    columns = CATALOG_SORTS[sort]
+    if not isinstance(decoded, list) or len(decoded) != len(columns) + 1 or decoded[0] != sort:
+        raise ValueError('cursor')
+    values = decoded[1:]
+    for column, value in zip(columns, values):
+        expected = str if column in ('rarity', 'category') else int
+        if not isinstance(value, expected) or isinstance(value, bool):
+            raise ValueError('cursor')
+        if expected is int:
+            to_int4(value)
+    return values
+
+def parse_catalog_query(params: Dict[str, str]) -> Dict[str, Any]:
+    '''
+    Business: Validate catalog filter, sort and pagination parameters
+    Args: params from queryStringParameters
+    Returns: normalized query; raises ValueError on bad input
+    '''
+    currency = params.get('currency')
+    if currency not in (None, 'coins', 'gems'):
+        raise ValueError('currency')
+    sort = params.get('sort', 'rarity')
+    if sort == 'price':
+        sort = 'price_gems' if currency == 'gems' else 'price_coins'
+    if sort not in CATALOG_SORTS:
+        raise ValueError('sort')
+    
+    limit = to_int4(params.get('limit', CATALOG_PAGE_DEFAULT))
+    if limit < 1 or limit > CATALOG_PAGE_MAX:
+        raise ValueError('limit')
+    
+    query: Dict[str, Any] = {
+        'sort': sort,
+        'limit': limit,
+        'currency': currency,
+        'categories': [c for c in params.get('category', '').split(',') if c],
+        'rarities': [r for r in params.get('rarity', '').split(',') if r],
+        'minPrice': to_int4(params['minPrice']) if params.get('minPrice') else None,
+        'maxPrice': to_int4(params['maxPrice']) if params.get('maxPrice') else None,
+        'stats': {column: to_int4(params[name]) for name, column in CATALOG_STAT_FILTERS.items() if params.get(name)},
+        'after': decode_cursor(params['cursor'], sort) if params.get('cursor') else None
+    }
+    return query
+
+def catalog_page_sql(query: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    '''
+    Business: Build the keyset page statement served by the composite item indexes
+    Args: query from parse_catalog_query
+    Returns: SQL with positional placeholders and its arguments (limit + 1 rows to detect a next page)
+    '''
+    conditions: List[str] = []
+    args: List[Any] = []
+    
+    if query['categories']:
+        conditions.append('category = ANY(%s)')
+        args.append(query['categories'])
+    if query['rarities']:
+        conditions.append('rarity = ANY(%s)')
+        args.append(query['rarities'])
+    
+    price_column = 'price_gems' if query['currency'] == 'gems' else 'price_coins'
+    if query['currency']:
+        conditions.append(f'{price_column} > 0')
+    if query['minPrice'] is not None:
+        conditions.append(f'{price_column} >= %s')
+        args.append(query['minPrice'])
+    if query['maxPrice'] is not None:
+        conditions.append(f'{price_column} <= %s')
+        args.append(query['maxPrice'])
+    for column, threshold in query['stats'].items():
+        conditions.append(f'{column} >= %s')
+        args.append(threshold)
+    
+    sort_columns = CATALOG_SORTS[query['sort']]
+    key = ', '.join(sort_columns)
+    if query['after'] is not None:
+        conditions.append(f'({key}) > ({", ".join(["%s"] * len(sort_columns))})')
+        args.extend(query['after'])
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    sql = f"SELECT {ITEM_COLUMNS} FROM t_p64683754_best_game_analysis.items {where} ORDER BY {key} LIMIT %s"
+    return sql, args + [query['limit'] + 1]
+
+def catalog_page(rows: List[Tuple], query: Dict[str, Any]) -> Dict[str, Any]:
+    sort_columns = CATALOG_SORTS[query['sort']]
+    page = rows[:query['limit']]
+    next_cursor = None
+    if len(rows) > query['limit']:
+        last = page[-1]
+        column_index = {'id': 0, 'rarity': 5, 'price_coins': 6, 'price_gems': 7}
+        next_cursor = encode_cursor(query['sort'], [last[column_index[c]] for c in sort_columns])
+    
+    return {'items': [item_to_dict(row) for row in page], 'nextCursor': next_cursor}
+
+def fetch_catalog_page(cur: Any, query: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Business: Read one keyset page of the catalog using the composite item indexes
+    Args: cur database cursor, query from parse_catalog_query
+    Returns: dict with items and nextCursor (None on the last page)
+    '''
+    cur.execute(*catalog_page_sql(query))
+    return catalog_page(cur.fetchall(), query)
+
+@instrumented('shop')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Business: Shop management - get items, buy items
-    Args: event with httpMethod, body (playerId, itemId, action)
+    Business: Shop management - get items (optionally filtered and paged), buy items, equip/unequip
+    Args: event with httpMethod, queryStringParameters (category, rarity, currency, minPrice, maxPrice, minAttack, minDefense, minHealth, sort, limit, cursor), bearer token header, body (itemId or action=buy_batch with items [{itemId, quantity}] or action=equip/unequip with inventoryId, idempotencyKey)
     Returns: HTTP response with items or purchase result
     '''
     method: str = event.get('httpMethod', 'GET')
@@ -141,135 +632,157 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, Idempotency-Key, Authorization, X-Auth-Token',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    params = event.get('queryStringParameters') or {}
+    catalog_query = None
+    if method == 'GET' and any(key in params for key in CATALOG_QUERY_KEYS):
+        try:
+            catalog_query = parse_catalog_query(params)
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Неверные параметры фильтра'})
+            }
+    
+    if method == 'GET' and catalog_query is None and catalog_is_fresh():
+        annotate(catalog='cached')
+        return catalog_response(event)
+    
+    pool = get_pool(connection_factory())
+    with phase('connect'):
+        conn = pool.acquire()
     cur = conn.cursor()
     
     try:
-        if method == 'GET':
-            cur.execute("SELECT COUNT(*) FROM t_p64683754_best_game_analysis.items")
-            count = cur.fetchone()[0]
-            
-            if count == 0:
-                for item in ITEMS_DATA:
-                    cur.execute(
-                        "INSERT INTO t_p64683754_best_game_analysis.items (name, icon, description, category, rarity, price_coins, price_gems, attack_bonus, defense_bonus, health_bonus, stackable, tradeable) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
-                        (
-                            item['name'], item['icon'], item.get('description', ''),
-                            item['category'], item['rarity'],
-                            item.get('price_coins', 0), item.get('price_gems', 0),
-                            item.get('attack_bonus', 0), item.get('defense_bonus', 0),
-                            item.get('health_bonus', 0), item.get('stackable', False),
-                            item.get('tradeable', True)
-                        )
-                    )
-                conn.commit()
-            
-            cur.execute("SELECT id, name, icon, description, category, rarity, price_coins, price_gems, attack_bonus, defense_bonus, health_bonus FROM t_p64683754_best_game_analysis.items ORDER BY rarity, price_coins, price_gems")
-            items = cur.fetchall()
-            
-            result = []
-            for item in items:
-                result.append({
-                    'id': item[0],
-                    'name': item[1],
-                    'icon': item[2],
-                    'description': item[3],
-                    'category': item[4],
-                    'rarity': item[5],
-                    'priceCoins': item[6],
-                    'priceGems': item[7],
-                    'attackBonus': item[8],
-                    'defenseBonus': item[9],
-                    'healthBonus': item[10]
-                })
-            
+        if method == 'GET' and catalog_query is not None:
+            annotate(catalog='page')
+            page = fetch_catalog_page(cur, catalog_query)
+            with phase('encode'):
+                body = json.dumps(page)
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'items': result})
+                'body': body
             }
         
-        elif method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            player_id = body_data.get('playerId')
-            item_id = body_data.get('itemId')
+        elif method == 'GET':
+            cur.execute(CATALOG_VERSION_SQL)
+            db_version = cur.fetchone()[0]
+            
+            if catalog_is_stale(db_version):
+                annotate(catalog='rebuilt')
+                cur.execute(CATALOG_SQL)
+                with phase('encode'):
+                    result = [item_to_dict(item) for item in cur.fetchall()]
+                    body = json.dumps({'items': result})
+                
+                store_catalog(db_version, body)
+            else:
+                annotate(catalog='revalidated')
+                touch_catalog()
             
-            cur.execute("SELECT coins, gems FROM t_p64683754_best_game_analysis.players WHERE id = %s", (player_id,))
-            player = cur.fetchone()
+            return catalog_response(event)
+        
+        elif method == 'POST':
+            with phase('decode'):
+                body_data = json.loads(event.get('body', '{}'))
+            annotate(action=body_data.get('action', 'buy'))
+            with phase('session'):
+                player_id = resolve_player(cur, event)
             
-            if not player:
+            if player_id is None:
                 return {
-                    'statusCode': 404,
+                    'statusCode': 401,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Игрок не найден'})
+                    'body': json.dumps({'error': 'Требуется авторизация'})
                 }
             
-            cur.execute("SELECT price_coins, price_gems, attack_bonus, defense_bonus, health_bonus FROM t_p64683754_best_game_analysis.items WHERE id = %s", (item_id,))
-            item = cur.fetchone()
+            idempotency_key = body_data.get('idempotencyKey') or get_header(event, 'Idempotency-Key')
             
-            if not item:
+            if idempotency_key is not None and (not isinstance(idempotency_key, str) or len(idempotency_key) > 64):
                 return {
-                    'statusCode': 404,
+                    'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Предмет не найден'})
+                    'body': json.dumps({'error': 'Неверный ключ запроса'})
                 }
             
-            price_coins, price_gems = item[0], item[1]
-            
-            if price_gems > 0 and player[1] < price_gems:
+            try:
+                item_id = parse_id(body_data.get('itemId'))
+                inventory_id = parse_id(body_data.get('inventoryId'))
+            except ValueError:
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Недостаточно кристаллов'})
+                    'body': json.dumps({'error': 'Неверный идентификатор предмета'})
                 }
             
-            if price_coins > 0 and player[0] < price_coins:
+            if body_data.get('action') in ('equip', 'unequip'):
+                equipped = body_data['action'] == 'equip'
+                cur.execute(EQUIP_SQL, {
+                    'player_id': player_id,
+                    'inventory_id': inventory_id,
+                    'equipped': equipped,
+                    'sign': 1 if equipped else -1
+                })
+                row = cur.fetchone()
+                if row[0] is not None:
+                    conn.commit()
+                    stats = row[0:3]
+                else:
+                    conn.rollback()
+                    stats = row[3:6]
+                
+                if row[6] is None or stats[0] is None:
+                    return {
+                        'statusCode': 404,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Предмет не найден'})
+                    }
+                
                 return {
-                    'statusCode': 400,
+                    'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Недостаточно монет'})
+                    'body': json.dumps({
+                        'success': True,
+                        'equipped': equipped,
+                        'attack': stats[0],
+                        'defense': stats[1],
+                        'maxHealth': stats[2]
+                    })
                 }
             
-            if price_gems > 0:
-                cur.execute("UPDATE t_p64683754_best_game_analysis.players SET gems = gems - %s WHERE id = %s", (price_gems, player_id))
-            if price_coins > 0:
-                cur.execute("UPDATE t_p64683754_best_game_analysis.players SET coins = coins - %s WHERE id = %s", (price_coins, player_id))
-            
-            cur.execute(
-                "INSERT INTO t_p64683754_best_game_analysis.inventory (player_id, item_id, quantity) VALUES (%s, %s, 1)",
-                (player_id, item_id)
-            )
-            
-            cur.execute(
-                "UPDATE t_p64683754_best_game_analysis.players SET attack = attack + %s, defense = defense + %s, max_health = max_health + %s WHERE id = %s",
-                (item[2], item[3], item[4], player_id)
-            )
-            
-            conn.commit()
-            
-            cur.execute("SELECT coins, gems, attack, defense, max_health FROM t_p64683754_best_game_analysis.players WHERE id = %s", (player_id,))
-            updated_player = cur.fetchone()
+            if body_data.get('action') == 'buy_batch':
+                cart = parse_cart(body_data.get('items'))
+                if cart is None:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Неверная корзина'})
+                    }
+                params = {
+                    'player_id': player_id,
+                    'item_ids': list(cart.keys()),
+                    'quantities': list(cart.values()),
+                    'item_count': len(cart),
+                    'idempotency_key': idempotency_key
+                }
+                return settle_purchase(conn, cur, BATCH_PURCHASE_SQL, params)
             
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': True,
-                    'coins': updated_player[0],
-                    'gems': updated_player[1],
-                    'attack': updated_player[2],
-                    'defense': updated_player[3],
-                    'maxHealth': updated_player[4]
-                })
-            }
+            params = {'player_id': player_id, 'item_id': item_id, 'idempotency_key': idempotency_key}
+            return settle_purchase(conn, cur, PURCHASE_SQL, params)
+        
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'})
+        }
     
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        pool.release(conn)
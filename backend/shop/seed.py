@@ -0,0 +1,70 @@
+import json
+import os
+import sys
+from typing import Dict, Any
+import psycopg2
+import psycopg2.extras
+from index import ITEMS_DATA
+
+SYNC_SQL = '''
+INSERT INTO t_p64683754_best_game_analysis.items
+    (name, icon, description, category, rarity, price_coins, price_gems, attack_bonus, defense_bonus, health_bonus, stackable, tradeable)
+VALUES %s
+ON CONFLICT (name) DO UPDATE
+SET icon = EXCLUDED.icon,
+    description = EXCLUDED.description,
+    category = EXCLUDED.category,
+    rarity = EXCLUDED.rarity,
+    price_coins = EXCLUDED.price_coins,
+    price_gems = EXCLUDED.price_gems,
+    attack_bonus = EXCLUDED.attack_bonus,
+    defense_bonus = EXCLUDED.defense_bonus,
+    health_bonus = EXCLUDED.health_bonus,
+    stackable = EXCLUDED.stackable,
+    tradeable = EXCLUDED.tradeable
+WHERE (items.icon, items.description, items.category, items.rarity, items.price_coins, items.price_gems,
+       items.attack_bonus, items.defense_bonus, items.health_bonus, items.stackable, items.tradeable)
+      IS DISTINCT FROM
+      (EXCLUDED.icon, EXCLUDED.description, EXCLUDED.category, EXCLUDED.rarity, EXCLUDED.price_coins, EXCLUDED.price_gems,
+       EXCLUDED.attack_bonus, EXCLUDED.defense_bonus, EXCLUDED.health_bonus, EXCLUDED.stackable, EXCLUDED.tradeable)
+RETURNING name, xmax = 0
+'''
+
+
+def sync_catalog(cur: Any) -> Dict[str, Any]:
+    '''
+    Business: Upsert the whole ITEMS_DATA catalog in one batch keyed by item name
+    Args: cur of an open transaction
+    Returns: report with inserted and updated names and the unchanged count
+    '''
+    rows = [
+        (
+            item['name'], item['icon'], item.get('description', ''),
+            item['category'], item['rarity'],
+            item.get('price_coins', 0), item.get('price_gems', 0),
+            item.get('attack_bonus', 0), item.get('defense_bonus', 0),
+            item.get('health_bonus', 0), item.get('stackable', False),
+            item.get('tradeable', True)
+        )
+        for item in ITEMS_DATA
+    ]
+    changed = psycopg2.extras.execute_values(cur, SYNC_SQL, rows, page_size=len(rows), fetch=True)
+    inserted = [name for name, is_new in changed if is_new]
+    updated = [name for name, is_new in changed if not is_new]
+    return {
+        'inserted': inserted,
+        'updated': updated,
+        'unchanged': len(rows) - len(changed)
+    }
+
+
+if __name__ == '__main__':
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                report = sync_catalog(cur)
+    finally:
+        conn.close()
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write('\n')
@@ -0,0 +1,6 @@
+CREATE INDEX IF NOT EXISTS idx_items_rarity_sort ON items(rarity, price_coins, price_gems, id);
+CREATE INDEX IF NOT EXISTS idx_items_category_sort ON items(category, rarity, price_coins, price_gems, id);
+CREATE INDEX IF NOT EXISTS idx_items_category_price_coins ON items(category, price_coins, id);
+CREATE INDEX IF NOT EXISTS idx_items_category_price_gems ON items(category, price_gems, id);
+CREATE INDEX IF NOT EXISTS idx_items_price_coins ON items(price_coins, id) WHERE price_coins > 0;
+CREATE INDEX IF NOT EXISTS idx_items_price_gems ON items(price_gems, id) WHERE price_gems > 0;
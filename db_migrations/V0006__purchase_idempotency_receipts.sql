@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS purchases (
+    id SERIAL PRIMARY KEY,
+    player_id INTEGER NOT NULL REFERENCES players(id),
+    item_id INTEGER REFERENCES items(id),
+    idempotency_key VARCHAR(64) NOT NULL,
+    coins INTEGER NOT NULL,
+    gems INTEGER NOT NULL,
+    attack INTEGER NOT NULL,
+    defense INTEGER NOT NULL,
+    max_health INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    UNIQUE (player_id, idempotency_key)
+);
@@ -0,0 +1,27 @@
+ALTER TABLE inventory ADD COLUMN IF NOT EXISTS stackable BOOLEAN NOT NULL DEFAULT false;
+
+UPDATE inventory inv
+SET stackable = true
+FROM items i
+WHERE i.id = inv.item_id AND i.stackable AND NOT inv.stackable;
+
+WITH merged AS (
+    SELECT MIN(id) AS keep_id, player_id, item_id, SUM(quantity) AS quantity, BOOL_OR(equipped) AS equipped
+    FROM inventory
+    WHERE stackable
+    GROUP BY player_id, item_id
+    HAVING COUNT(*) > 1
+), kept AS (
+    UPDATE inventory inv
+    SET quantity = m.quantity, equipped = m.equipped
+    FROM merged m
+    WHERE inv.id = m.keep_id
+)
+DELETE FROM inventory inv
+USING merged m
+WHERE inv.stackable
+  AND inv.player_id = m.player_id
+  AND inv.item_id = m.item_id
+  AND inv.id <> m.keep_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_inventory_stackable ON inventory(player_id, item_id) WHERE stackable;
@@ -0,0 +1,64 @@
+CREATE TABLE IF NOT EXISTS player_effective_stats (
+    player_id INTEGER PRIMARY KEY REFERENCES players(id),
+    attack INTEGER NOT NULL,
+    defense INTEGER NOT NULL,
+    max_health INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+UPDATE players p
+SET attack = p.attack - b.attack,
+    defense = p.defense - b.defense,
+    max_health = p.max_health - b.health
+FROM (
+    SELECT inv.player_id,
+           SUM(i.attack_bonus * inv.quantity) AS attack,
+           SUM(i.defense_bonus * inv.quantity) AS defense,
+           SUM(i.health_bonus * inv.quantity) AS health
+    FROM inventory inv
+    JOIN items i ON i.id = inv.item_id
+    WHERE NOT inv.stackable
+    GROUP BY inv.player_id
+) b
+WHERE p.id = b.player_id;
+
+UPDATE inventory SET equipped = true WHERE NOT stackable AND NOT equipped;
+
+CREATE OR REPLACE FUNCTION rebuild_player_effective_stats() RETURNS INTEGER
+SET search_path FROM CURRENT
+AS $$
+DECLARE
+    affected INTEGER;
+BEGIN
+    INSERT INTO player_effective_stats (player_id, attack, defense, max_health, updated_at)
+    SELECT p.id,
+           p.attack + COALESCE(b.attack, 0),
+           p.defense + COALESCE(b.defense, 0),
+           p.max_health + COALESCE(b.health, 0),
+           NOW()
+    FROM players p
+    LEFT JOIN (
+        SELECT inv.player_id,
+               SUM(i.attack_bonus) AS attack,
+               SUM(i.defense_bonus) AS defense,
+               SUM(i.health_bonus) AS health
+        FROM inventory inv
+        JOIN items i ON i.id = inv.item_id
+        WHERE inv.equipped
+        GROUP BY inv.player_id
+    ) b ON b.player_id = p.id
+    ON CONFLICT (player_id) DO UPDATE
+    SET attack = EXCLUDED.attack,
+        defense = EXCLUDED.defense,
+        max_health = EXCLUDED.max_health,
+        updated_at = EXCLUDED.updated_at
+    WHERE (player_effective_stats.attack, player_effective_stats.defense, player_effective_stats.max_health)
+          IS DISTINCT FROM (EXCLUDED.attack, EXCLUDED.defense, EXCLUDED.max_health);
+    GET DIAGNOSTICS affected = ROW_COUNT;
+    RETURN affected;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_player_effective_stats();
+
+CREATE INDEX IF NOT EXISTS idx_inventory_player_equipped ON inventory(player_id) WHERE equipped;
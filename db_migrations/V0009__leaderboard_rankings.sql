@@ -0,0 +1,57 @@
+ALTER TABLE players ADD COLUMN IF NOT EXISTS pvp_wins INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE players ADD COLUMN IF NOT EXISTS pvp_losses INTEGER NOT NULL DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS player_weekly_scores (
+    week_start DATE NOT NULL,
+    player_id INTEGER NOT NULL REFERENCES players(id),
+    score INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (week_start, player_id)
+);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS leaderboard_ranks AS
+SELECT p.id AS player_id,
+       p.username,
+       p.avatar,
+       p.level,
+       p.experience,
+       p.coins,
+       p.pvp_wins,
+       COALESCE(w.score, 0) AS weekly_score,
+       ROW_NUMBER() OVER (ORDER BY p.level DESC, p.experience DESC, p.id) AS level_rank,
+       ROW_NUMBER() OVER (ORDER BY p.coins DESC, p.id) AS coins_rank,
+       ROW_NUMBER() OVER (ORDER BY p.pvp_wins DESC, p.id) AS pvp_rank,
+       ROW_NUMBER() OVER (ORDER BY COALESCE(w.score, 0) DESC, p.id) AS weekly_rank
+FROM players p
+LEFT JOIN player_weekly_scores w
+       ON w.player_id = p.id AND w.week_start = date_trunc('week', NOW())::date;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_leaderboard_ranks_player ON leaderboard_ranks(player_id);
+CREATE INDEX IF NOT EXISTS idx_leaderboard_level_rank ON leaderboard_ranks(level_rank);
+CREATE INDEX IF NOT EXISTS idx_leaderboard_coins_rank ON leaderboard_ranks(coins_rank);
+CREATE INDEX IF NOT EXISTS idx_leaderboard_pvp_rank ON leaderboard_ranks(pvp_rank);
+CREATE INDEX IF NOT EXISTS idx_leaderboard_weekly_rank ON leaderboard_ranks(weekly_rank);
+
+CREATE TABLE IF NOT EXISTS leaderboard_meta (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    refreshed_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO leaderboard_meta (id, refreshed_at) VALUES (1, NOW()) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION refresh_leaderboard_if_stale(max_age_seconds INTEGER) RETURNS BOOLEAN
+SET search_path FROM CURRENT
+AS $$
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('leaderboard_ranks')) THEN
+        RETURN false;
+    END IF;
+    UPDATE leaderboard_meta SET refreshed_at = NOW()
+    WHERE id = 1 AND refreshed_at < NOW() - make_interval(secs => max_age_seconds);
+    IF NOT FOUND THEN
+        RETURN false;
+    END IF;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY leaderboard_ranks;
+    DELETE FROM player_weekly_scores WHERE week_start < date_trunc('week', NOW())::date - 28;
+    RETURN true;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,19 @@
+CREATE TABLE IF NOT EXISTS pvp_duels (
+    id SERIAL PRIMARY KEY,
+    player_id INTEGER NOT NULL REFERENCES players(id),
+    opponent_id INTEGER NOT NULL REFERENCES players(id),
+    winner_id INTEGER NOT NULL REFERENCES players(id),
+    bet INTEGER NOT NULL,
+    player_power INTEGER NOT NULL,
+    opponent_power INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_pvp_duels_player ON pvp_duels(player_id);
+CREATE INDEX IF NOT EXISTS idx_pvp_duels_opponent ON pvp_duels(opponent_id);
+
+CREATE TABLE IF NOT EXISTS pvp_queue (
+    player_id INTEGER PRIMARY KEY REFERENCES players(id),
+    bet INTEGER NOT NULL,
+    queued_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,60 @@
+DROP INDEX IF EXISTS uq_inventory_stackable;
+
+UPDATE inventory inv
+SET item_id = d.keep_id
+FROM (
+    SELECT i.id AS dup_id, k.keep_id
+    FROM items i
+    JOIN (SELECT name, MIN(id) AS keep_id FROM items GROUP BY name) k ON k.name = i.name
+    WHERE i.id <> k.keep_id
+) d
+WHERE inv.item_id = d.dup_id;
+
+UPDATE purchases pu
+SET item_id = d.keep_id
+FROM (
+    SELECT i.id AS dup_id, k.keep_id
+    FROM items i
+    JOIN (SELECT name, MIN(id) AS keep_id FROM items GROUP BY name) k ON k.name = i.name
+    WHERE i.id <> k.keep_id
+) d
+WHERE pu.item_id = d.dup_id;
+
+UPDATE trades t
+SET item_id = d.keep_id
+FROM (
+    SELECT i.id AS dup_id, k.keep_id
+    FROM items i
+    JOIN (SELECT name, MIN(id) AS keep_id FROM items GROUP BY name) k ON k.name = i.name
+    WHERE i.id <> k.keep_id
+) d
+WHERE t.item_id = d.dup_id;
+
+WITH merged AS (
+    SELECT MIN(id) AS keep_id, player_id, item_id, SUM(quantity) AS quantity, BOOL_OR(equipped) AS equipped
+    FROM inventory
+    WHERE stackable
+    GROUP BY player_id, item_id
+    HAVING COUNT(*) > 1
+), kept AS (
+    UPDATE inventory inv
+    SET quantity = m.quantity, equipped = m.equipped
+    FROM merged m
+    WHERE inv.id = m.keep_id
+)
+DELETE FROM inventory inv
+USING merged m
+WHERE inv.stackable
+  AND inv.player_id = m.player_id
+  AND inv.item_id = m.item_id
+  AND inv.id <> m.keep_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_inventory_stackable ON inventory(player_id, item_id) WHERE stackable;
+
+DELETE FROM items i
+USING (SELECT name, MIN(id) AS keep_id FROM items GROUP BY name) k
+WHERE k.name = i.name AND i.id <> k.keep_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_items_name ON items(name);
+
+SELECT rebuild_player_effective_stats();
@@ -0,0 +1,46 @@
+CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS TRIGGER
+SET search_path FROM CURRENT
+AS $$
+DECLARE
+    changed BOOLEAN;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        changed := EXISTS (SELECT 1 FROM new_rows);
+    ELSIF TG_OP = 'DELETE' THEN
+        changed := EXISTS (SELECT 1 FROM old_rows);
+    ELSIF TG_OP = 'UPDATE' THEN
+        changed := EXISTS (
+            SELECT 1 FROM new_rows n JOIN old_rows o ON o.id = n.id
+            WHERE n IS DISTINCT FROM o
+        );
+    ELSE
+        changed := true;
+    END IF;
+
+    IF changed THEN
+        UPDATE catalog_version SET version = version + 1, updated_at = NOW() WHERE id = 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_items_catalog_version ON items;
+
+CREATE TRIGGER trg_items_catalog_version_insert
+    AFTER INSERT ON items
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+CREATE TRIGGER trg_items_catalog_version_update
+    AFTER UPDATE ON items
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+CREATE TRIGGER trg_items_catalog_version_delete
+    AFTER DELETE ON items
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+CREATE TRIGGER trg_items_catalog_version_truncate
+    AFTER TRUNCATE ON items
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();